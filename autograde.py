@@ -0,0 +1,257 @@
+import os
+import re
+import sys
+import argparse
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from reply_io import append_updates, is_jsonl, load_results, save_results
+
+# --- Configuration ---
+# Grades below this confidence are left as null for a human in redit.py
+DEFAULT_MIN_CONFIDENCE = 0.8
+# Words that carry no meaning on their own in an expected answer
+STOPWORDS = {
+    "a", "an", "the", "in", "as", "of", "to", "is", "it", "and", "or", "on", "at", "by",
+    "approximately", "about", "around", "roughly", "years", "year", "old",
+}
+# Replies to trick questions ("There is no X in the game") that reject the premise
+PREMISE_REJECTIONS = (
+    "there is no", "there are no", "there isn't", "does not exist", "doesn't exist",
+    "no such", "not in the game", "not part of the game", "never", "you can't", "you cannot",
+    "is not a", "isn't a", "does not have", "doesn't have",
+)
+JUDGE_SYSTEM_PROMPT = (
+    "You grade answers to trivia questions about the indie horror game OMORI. "
+    "Compare the reply with the expected answer and respond with exactly one word: "
+    "CORRECT if the reply gives the expected answer, INCORRECT otherwise."
+)
+# --- End Configuration ---
+
+MARKDOWN_RE = re.compile(r"[*_`#>~|\[\]]+")
+PUNCTUATION_RE = re.compile(r"[^\w\s']")
+PARENTHETICAL_RE = re.compile(r"\([^)]*\)")
+AT_LEAST_RE = re.compile(r"at least (\w+) of them", re.IGNORECASE)
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5}
+
+def normalize_text(text):
+    """Casefold, drop markdown and punctuation, and collapse whitespace."""
+    text = unicodedata.normalize("NFKC", text or "").casefold().replace("’", "'")
+    text = MARKDOWN_RE.sub(" ", text)
+    text = PUNCTUATION_RE.sub(" ", text)
+    return " ".join(text.split())
+
+def expected_core(expected):
+    """The expected answer without parenthetical notes and leading filler words."""
+    words = normalize_text(PARENTHETICAL_RE.sub(" ", expected)).split()
+    while words and words[0] in STOPWORDS:
+        words.pop(0)
+    return " ".join(words)
+
+def contains_phrase(text, phrase):
+    """Whole-word substring test on normalized text."""
+    return bool(phrase) and f" {phrase} " in f" {text} "
+
+# Confidences below are roughly each rule's precision against the human grades in rated-replies/.
+# Long replies often name the right answer and then contradict it, which is why none reach 1.0.
+
+def grade_exact(expected, reply):
+    """Tier 1: the normalized expected answer appears verbatim in the reply."""
+    core = expected_core(expected)
+    if core and contains_phrase(normalize_text(reply), core):
+        return True, 0.85
+    return None
+
+def grade_rules(expected, reply):
+    """Tier 2: alias, keyword and yes/no rules for short expected answers."""
+    norm_reply = normalize_text(reply)
+    without_notes = PARENTHETICAL_RE.sub(" ", expected)
+
+    # "Bo En, Jami Carignan, Slime Girls (at least two of them must be mentioned)"
+    at_least = AT_LEAST_RE.search(expected)
+    if at_least:
+        needed = NUMBER_WORDS.get(at_least.group(1).lower())
+        if needed is None and at_least.group(1).isdigit():
+            needed = int(at_least.group(1))
+        items = [expected_core(item) for item in without_notes.split(",")]
+        mentioned = sum(contains_phrase(norm_reply, item) for item in items if item)
+        if needed and mentioned >= needed:
+            return True, 0.9
+        return None
+
+    # "Yes. (The name of the whale is HUMPHREY)"
+    words = expected_core(expected).split()
+    if words and words[0] in ("yes", "no") and len(words) <= 2:
+        reply_words = norm_reply.split()
+        if reply_words and reply_words[0] in ("yes", "no"):
+            return reply_words[0] == words[0], 0.8
+        return None
+
+    # "As OMORI/SUNNY", "Deep Well/Underwater highway."
+    if "/" in without_notes and len(without_notes) < 60:
+        for alias in without_notes.split("/"):
+            core = expected_core(alias)
+            if core and contains_phrase(norm_reply, core):
+                return True, 0.8
+
+    # "In December 2020." -> every keyword mentioned somewhere in the reply
+    keywords = [word for word in expected_core(expected).split() if word not in STOPWORDS]
+    if 0 < len(keywords) <= 4 and all(contains_phrase(norm_reply, word) for word in keywords):
+        return True, 0.8
+
+    # "There is no MYSTICAL FLUTE item in the game." -> reply rejects the premise
+    if expected_core(expected).startswith(("there is no", "there are no", "you can't")):
+        if any(phrase in norm_reply for phrase in PREMISE_REJECTIONS):
+            return True, 0.65
+    return None
+
+def grade_with_judge(question, judge):
+    """Tier 3: ask an LLM judge. `judge` maps a prompt to the judge's reply text."""
+    prompt = (
+        f"Question: {question.get('question', '')}\n"
+        f"Expected answer: {question.get('expected_answer', '')}\n"
+        f"Reply: {question.get('reply', '')}"
+    )
+    verdict = normalize_text(judge(prompt)).split()
+    if verdict and verdict[0] in ("correct", "incorrect"):
+        return verdict[0] == "correct", 0.85
+    return None
+
+def grade_question(question, min_confidence, judge=None, grade_index=None):
+    """Run the tiers in order. Returns (verdict, confidence, tier) or None if undecided."""
+    expected = question.get("expected_answer") or ""
+    reply = question.get("reply") or ""
+    if not reply.strip():
+        return False, 1.0, "empty"
+    if grade_index is not None:
+        # A verdict already given to an equivalent reply beats any string rule
+        found = grade_index.lookup(question.get("question", ""), reply)
+        if found is not None and found[1] >= min_confidence:
+            return found[0], round(found[1], 2), "duplicate" if found[1] == 1.0 else "near-duplicate"
+    for tier, grader in (("exact", grade_exact), ("rules", grade_rules)):
+        result = grader(expected, reply)
+        if result is not None and result[1] >= min_confidence:
+            return result[0], result[1], tier
+    if judge is not None:
+        result = grade_with_judge(question, judge)
+        if result is not None and result[1] >= min_confidence:
+            return result[0], result[1], "judge"
+    return None
+
+def make_judge(judge_model, api_key):
+    """Return a callable that sends a grading prompt to `judge_model` through OpenRouter."""
+    from raiq import create_session, get_llm_reply
+    from ratelimit import RequestFailed
+    session = create_session(8)
+
+    def judge(prompt):
+        try:
+            reply, _headers, _metrics = get_llm_reply(judge_model, prompt, api_key, session,
+                                                      system_prompt=JUDGE_SYSTEM_PROMPT)
+        except RequestFailed as e:
+            print(f"Judge request failed: {e}")
+            return ""
+        return reply
+    return judge
+
+def grade_file(filepath, output_path, min_confidence, judge_model=None, api_key=None, dry_run=False, grade_index=None):
+    """Fill in every null 'correct' in one replies file, including those of repeated samples. Returns a summary dict."""
+    data = load_results(filepath)
+
+    # (question, target): target is the question itself or one of its "samples" entries
+    pending = []
+    for section in data.get("sections", []):
+        for question in section.get("questions", []):
+            if question.get("skipped"):
+                continue  # Skipped questions were never asked
+            if question.get("correct") is None:
+                pending.append((question, question))
+            pending.extend((question, sample) for sample in question.get("samples") or [] if sample.get("correct") is None)
+    judge = make_judge(judge_model, api_key) if judge_model else None
+    tiers = {}
+    updates = {}
+    verdicts = {}  # (question, reply) -> result, since samples often repeat a reply word for word
+
+    def grade(job):
+        question, target = job
+        key = (question.get("question", ""), target.get("reply") or "")
+        if key not in verdicts:
+            verdicts[key] = grade_question({**question, "reply": target.get("reply")}, min_confidence, judge, grade_index)
+        return question, target, verdicts[key]
+
+    # Judge calls are network-bound, so they get threads; the string tiers are cheap either way
+    with ThreadPoolExecutor(max_workers=8 if judge else 1) as pool:
+        for question, target, result in pool.map(grade, pending):
+            if result is None:
+                tiers["undecided"] = tiers.get("undecided", 0) + 1
+                continue
+            verdict, confidence, tier = result
+            target["correct"] = verdict
+            target["graded_by"] = tier
+            target["grade_confidence"] = confidence
+            fields = updates.setdefault(question.get("id"), {})
+            if target is question:
+                fields.update(correct=verdict, graded_by=tier, grade_confidence=confidence)
+            else:
+                fields["samples"] = question["samples"]
+            tiers[tier] = tiers.get(tier, 0) + 1
+
+    in_place_jsonl = output_path == filepath and is_jsonl(filepath) and None not in updates
+    if not dry_run and in_place_jsonl:
+        # Grading a .jsonl file in place only appends the new verdicts
+        if updates:
+            append_updates(filepath, updates)
+    elif not dry_run and (output_path != filepath or updates):
+        save_results(output_path, data)
+    return {"file": filepath, "output": output_path, "pending": len(pending), "tiers": tiers}
+
+def main():
+    parser = argparse.ArgumentParser(description="Automatically grade null 'correct' entries in replies JSON files.")
+    parser.add_argument("files", nargs="+", help="Replies JSON files to grade")
+    parser.add_argument("--output-dir", help="Write graded files here instead of overwriting the inputs (e.g., rated-replies)")
+    parser.add_argument("--min-confidence", type=float, default=DEFAULT_MIN_CONFIDENCE,
+                        help=f"Leave grades below this confidence for redit.py (default: {DEFAULT_MIN_CONFIDENCE})")
+    parser.add_argument("--judge-model", help="OR model used as an LLM judge for answers the string rules can't decide")
+    parser.add_argument("--no-dedupe", action="store_true", help="Don't reuse verdicts from equivalent replies in replies/ and rated-replies/")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Number of files graded in parallel")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be graded without writing anything")
+    args = parser.parse_args()
+
+    api_key = None
+    if args.judge_model:
+        from dotenv import load_dotenv
+        load_dotenv()
+        api_key = os.getenv("OPENROUTER_KEY")
+        if not api_key:
+            raise ValueError("Please set the OPENROUTER_KEY environment variable in your .env file.")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    grade_index = None
+    if not args.no_dedupe:
+        from grade_index import build_index
+        grade_index = build_index(exclude=args.files)
+
+    jobs = []
+    for filepath in args.files:
+        output_path = os.path.join(args.output_dir, os.path.basename(filepath)) if args.output_dir else filepath
+        jobs.append((filepath, output_path, args.min_confidence, args.judge_model, api_key, args.dry_run, grade_index))
+
+    failed = False
+    with ProcessPoolExecutor(max_workers=max(1, min(args.jobs, len(jobs)))) as pool:
+        futures = [pool.submit(grade_file, *job) for job in jobs]
+        for future, job in zip(futures, jobs):
+            try:
+                summary = future.result()
+            except (OSError, ValueError) as e:
+                print(f"Error: Could not grade '{job[0]}': {e}")
+                failed = True
+                continue
+            tiers = ", ".join(f"{tier}: {count}" for tier, count in sorted(summary["tiers"].items())) or "nothing to grade"
+            print(f"{summary['file']}: {summary['pending']} ungraded -> {tiers}")
+            if summary["tiers"].get("undecided"):
+                print(f"  Finish the rest with: python redit.py {summary['output']}")
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+from reply_io import iter_questions
+from telemetry import percentile
+
+# --- Configuration ---
+DEFAULT_CONCURRENCY = [1, 4, 8, 16, 32]
+DEFAULT_QUESTIONS = 200
+DEFAULT_TOLERANCE = 0.1  # Fractional drop in questions/sec versus the baseline that counts as a regression
+# --- End Configuration ---
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def write_questions(path, count):
+    """A synthetic questions file with `count` questions spread over a few sections."""
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            if i % 50 == 0:
+                f.write(f"### Benchmark section {i // 50 + 1}\n\n")
+            f.write(f"Q: Benchmark question number {i}?\nA: Answer {i}\n\n")
+
+def start_mock(args):
+    """Start mock_openrouter.py on a free port. Returns (process, endpoint URL)."""
+    command = [sys.executable, os.path.join(HERE, "mock_openrouter.py"), "--port", "0",
+               "--latency", args.latency, "--tokens", str(args.tokens), "--tokens-per-sec", str(args.tokens_per_sec),
+               "--throttle-rate", str(args.throttle_rate), "--error-rate", str(args.error_rate),
+               "--retry-after", str(args.retry_after)]
+    if args.seed is not None:
+        command += ["--seed", str(args.seed)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if " on " not in line:
+        process.kill()
+        raise RuntimeError("Mock server did not start")
+    return process, line.split(" on ", 1)[1].strip()
+
+def mock_request(base_url, path, post=False):
+    request = urllib.request.Request(base_url + path, data=b"{}" if post else None, method="POST" if post else "GET")
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+def run_raiq(workdir, api_url, concurrency, args):
+    """Run raiq.py once against the mock server. Returns a result dict."""
+    output = os.path.join(workdir, f"replies-c{concurrency}.json")
+    command = [sys.executable, os.path.join(HERE, "raiq.py"), "--model", "bench/mock", "--input", "questions.txt",
+               "--output", output, "--concurrency", str(concurrency), "--rate", str(args.rate),
+               "--max-rate", str(args.rate), "--max-retries", str(args.max_retries), "--api-url", api_url, "--no-cache"]
+    if args.stream:
+        command.append("--stream")
+    env = dict(os.environ, OPENROUTER_KEY="benchmark")
+    log_path = os.path.join(workdir, f"raiq-c{concurrency}.log")
+    with open(log_path, 'w') as log:
+        started = time.monotonic()
+        process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            _pid, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            peak_rss_mb = usage.ru_maxrss / (1 << 20 if sys.platform == "darwin" else 1 << 10)
+        else:
+            process.wait()
+            peak_rss_mb = None
+        elapsed = time.monotonic() - started
+    if process.returncode != 0 or not os.path.exists(output):
+        raise RuntimeError(f"raiq.py exited with code {process.returncode}; see {log_path}")
+
+    latencies, failed = [], 0
+    for _section_name, question in iter_questions(output):
+        if not question.get("reply"):
+            failed += 1
+        elif question.get("metrics"):
+            latencies.append(question["metrics"]["latency"])
+    answered = len(latencies)
+    return {
+        "concurrency": concurrency,
+        "questions": answered + failed,
+        "failed": failed,
+        "seconds": round(elapsed, 2),
+        "questions_per_sec": round(answered / elapsed, 2),
+        "p50": round(percentile(latencies, 0.50), 3) if latencies else None,
+        "p95": round(percentile(latencies, 0.95), 3) if latencies else None,
+        "p99": round(percentile(latencies, 0.99), 3) if latencies else None,
+        "peak_rss_mb": round(peak_rss_mb, 1) if peak_rss_mb is not None else None,
+    }
+
+def print_table(results):
+    print(f"\n{'conc':>5} {'q/s':>8} {'p50':>7} {'p95':>7} {'p99':>7} {'requests':>9} {'retries':>8} {'429':>5} {'5xx':>5} {'failed':>7} {'RSS MB':>7}")
+    for r in results:
+        cells = [f"{r['concurrency']:>5}", f"{r['questions_per_sec']:>8.2f}"]
+        cells += [f"{r[p]:>7.3f}" if r[p] is not None else f"{'-':>7}" for p in ("p50", "p95", "p99")]
+        cells += [f"{r['requests']:>9}", f"{r['retries']:>8}", f"{r['throttled']:>5}", f"{r['server_errors']:>5}", f"{r['failed']:>7}"]
+        cells.append(f"{r['peak_rss_mb']:>7.1f}" if r["peak_rss_mb"] is not None else f"{'-':>7}")
+        print(" ".join(cells))
+
+def find_regressions(results, baseline, tolerance):
+    """Settings whose questions/sec fell more than `tolerance` below the baseline run."""
+    previous = {r["concurrency"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        old = previous.get(r["concurrency"])
+        if old and r["questions_per_sec"] < old["questions_per_sec"] * (1 - tolerance):
+            regressions.append((r["concurrency"], old["questions_per_sec"], r["questions_per_sec"]))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure raiq.py throughput against a local mock of the OpenRouter API.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_CONCURRENCY,
+                        help=f"raiq.py --concurrency values to compare (default: {' '.join(map(str, DEFAULT_CONCURRENCY))})")
+    parser.add_argument("--questions", type=int, default=DEFAULT_QUESTIONS, help=f"Synthetic questions per run (default: {DEFAULT_QUESTIONS})")
+    parser.add_argument("--stream", action="store_true", help="Run raiq.py with --stream")
+    parser.add_argument("--rate", type=float, default=1000.0,
+                        help="raiq.py --rate and --max-rate; high by default so the pipeline, not the limiter, is measured (default: 1000)")
+    parser.add_argument("--max-retries", type=int, default=4, help="raiq.py --max-retries (default: 4)")
+    parser.add_argument("--latency", default="lognormal:0.5,0.5", help="Mock time-to-first-token distribution (default: lognormal:0.5,0.5)")
+    parser.add_argument("--tokens", type=int, default=100, help="Mock completion tokens per reply (default: 100)")
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0, help="Mock generation speed (default: 200)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of mock responses that are 429s (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of mock responses that are 5xx errors (default: 0)")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="Retry-After seconds on mock 429s (default: 0.5)")
+    parser.add_argument("--seed", type=int, default=0, help="Mock random seed, for comparable runs (default: 0)")
+    parser.add_argument("--save", help="Write the results as JSON here, e.g. to use as a later --baseline")
+    parser.add_argument("--baseline", help="Results JSON from an earlier run; exit with status 1 if throughput regressed")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Allowed drop in questions/sec versus --baseline (default: {DEFAULT_TOLERANCE})")
+    args = parser.parse_args()
+    if args.questions < 1 or min(args.concurrency) < 1:
+        parser.error("--questions and --concurrency must be at least 1")
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read baseline '{args.baseline}': {e}")
+            sys.exit(1)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="raiq-bench-") as workdir:
+        write_questions(os.path.join(workdir, "questions.txt"), args.questions)
+        mock, api_url = start_mock(args)
+        base_url = api_url.split("/api/", 1)[0]
+        print(f"Mock server at {api_url}; {args.questions} questions per run{', streaming' if args.stream else ''}.")
+        try:
+            for concurrency in args.concurrency:
+                mock_request(base_url, "/stats/reset", post=True)
+                try:
+                    result = run_raiq(workdir, api_url, concurrency, args)
+                except RuntimeError as e:
+                    print(f"Error: concurrency {concurrency}: {e}")
+                    sys.exit(1)
+                served = mock_request(base_url, "/stats")
+                result.update(requests=served["requests"], retries=served["requests"] - result["questions"],
+                              throttled=served["throttled"], server_errors=served["server_errors"],
+                              peak_in_flight=served["peak_in_flight"])
+                results.append(result)
+                print(f"concurrency {concurrency}: {result['questions_per_sec']:.2f} questions/sec")
+        finally:
+            mock.terminate()
+            mock.wait()
+
+    print_table(results)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({"settings": {k: v for k, v in vars(args).items() if k not in ("save", "baseline")},
+                       "results": results}, f, indent=4)
+        print(f"\nResults saved to {args.save}")
+    if baseline is not None:
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for concurrency, old, new in regressions:
+            print(f"REGRESSION at concurrency {concurrency}: {old:.2f} -> {new:.2f} questions/sec")
+        if regressions:
+            sys.exit(1)
+        print(f"\nNo throughput regressions against {args.baseline}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import sys
+import hashlib
+import argparse
+import numpy as np
+from autograde import normalize_text
+from reply_io import iter_questions, list_results_files, load_results, save_results
+
+# --- Configuration ---
+# The graded copy of a file comes first: a file name already indexed from one folder is skipped in the next
+DEFAULT_SOURCES = ["./rated-replies", "./replies"]
+NUM_PERMUTATIONS = 64
+BANDS = 16  # 16 bands of 4 rows: pairs above ~0.6 Jaccard almost always become candidates
+SHINGLE_SIZE = 3
+DEFAULT_THRESHOLD = 0.8
+# --- End Configuration ---
+
+MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(0x0A0A)  # Fixed seed: signatures must be comparable across runs
+PERM_A = _rng.integers(1, 1 << 32, NUM_PERMUTATIONS, dtype=np.uint64)
+PERM_B = _rng.integers(0, 1 << 32, NUM_PERMUTATIONS, dtype=np.uint64)
+
+def fingerprint(text):
+    """Hash of the normalized text; equal fingerprints mean equivalent replies."""
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+def minhash(text):
+    """MinHash signature over word shingles of the normalized text."""
+    words = normalize_text(text).split()
+    if len(words) < SHINGLE_SIZE:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+        dtype=np.uint64, count=len(shingles),
+    )
+    # 32-bit inputs and coefficients keep a*x+b inside uint64
+    return ((hashes[:, None] * PERM_A + PERM_B) % MERSENNE_PRIME).min(axis=0)
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return float(np.mean(sig_a == sig_b))
+
+class GradeIndex:
+    """Graded replies grouped by question, for reusing verdicts on equivalent replies."""
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.exact = {}     # (question key, fingerprint) -> {verdict: [source, ...]}
+        self.entries = []   # (question key, signature, verdict, source)
+        self.buckets = {}   # (question key, band, band hash) -> [entry index, ...]
+
+    def add(self, question, reply, verdict, source):
+        qkey = normalize_text(question)
+        self.exact.setdefault((qkey, fingerprint(reply)), {}).setdefault(verdict, []).append(source)
+        signature = minhash(reply)
+        self.entries.append((qkey, signature, verdict, source))
+        for band, rows in enumerate(np.split(signature, BANDS)):
+            self.buckets.setdefault((qkey, band, rows.tobytes()), []).append(len(self.entries) - 1)
+
+    def add_file(self, filepath):
+        """Index every human-graded reply in a results file. Returns the number added.
+
+        Machine grades (autograde.py tiers, earlier duplicates) are skipped, so
+        a guess is never handed back as a certain verdict. Files graded before
+        graded_by existed were graded by hand.
+        """
+        added = 0
+        source = os.path.basename(filepath)
+        for _section_name, question in iter_questions(filepath):
+            if question.get("correct") is None or not question.get("reply"):
+                continue
+            if question.get("graded_by", "human") != "human":
+                continue
+            self.add(question.get("question", ""), question["reply"], question["correct"], source)
+            added += 1
+        return added
+
+    def lookup(self, question, reply):
+        """Find a verdict for an equivalent reply to the same question.
+
+        Returns (verdict, similarity, sources) or None. Only a unanimous
+        verdict among the equivalent replies is returned.
+        """
+        if not reply:
+            return None
+        qkey = normalize_text(question)
+        verdicts = self.exact.get((qkey, fingerprint(reply)))
+        if verdicts and len(verdicts) == 1:
+            verdict, sources = next(iter(verdicts.items()))
+            return verdict, 1.0, sources
+
+        signature = minhash(reply)
+        candidates = set()
+        for band, rows in enumerate(np.split(signature, BANDS)):
+            candidates.update(self.buckets.get((qkey, band, rows.tobytes()), ()))
+        matches = []
+        for i in candidates:
+            _qkey, other, verdict, source = self.entries[i]
+            score = similarity(signature, other)
+            if score >= self.threshold:
+                matches.append((score, verdict, source))
+        if not matches or len({verdict for _score, verdict, _source in matches}) != 1:
+            return None
+        return matches[0][1], max(score for score, _verdict, _source in matches), [s for _score, _verdict, s in matches]
+
+def build_index(sources=DEFAULT_SOURCES, threshold=DEFAULT_THRESHOLD, exclude=()):
+    """Index all human-graded replies in the given folders, skipping files listed in `exclude`.
+
+    replies/ and rated-replies/ hold copies of the same file under the same
+    name, so each file name is indexed once, from the first folder that has
+    it; a file in `exclude` excludes its copies in the other folders too.
+    """
+    index = GradeIndex(threshold)
+    seen = {os.path.basename(path) for path in exclude}
+    for folder in sources:
+        for filepath in list_results_files(folder):
+            if os.path.basename(filepath) in seen:
+                continue
+            seen.add(os.path.basename(filepath))
+            try:
+                index.add_file(filepath)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not index '{filepath}': {e}")
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description="Reuse verdicts from equivalent replies to the same question.")
+    parser.add_argument("files", nargs="+", help="Replies JSON files with ungraded questions")
+    parser.add_argument("--sources", nargs="+", default=DEFAULT_SOURCES, help="Folders of graded files to index, graded copies first (default: rated-replies replies)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help=f"Minimum near-duplicate similarity (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--apply", action="store_true", help="Write propagated verdicts into the files instead of only reporting them")
+    args = parser.parse_args()
+
+    index = build_index(args.sources, args.threshold)
+    print(f"Indexed {len(index.entries)} graded replies.")
+    for filepath in args.files:
+        try:
+            data = load_results(filepath)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not load '{filepath}': {e}")
+            sys.exit(1)
+        ungraded = matched = 0
+        for section in data.get("sections", []):
+            for question in section.get("questions", []):
+                if question.get("correct") is not None:
+                    continue
+                ungraded += 1
+                found = index.lookup(question.get("question", ""), question.get("reply"))
+                if found is None:
+                    continue
+                verdict, score, sources = found
+                matched += 1
+                if args.apply:
+                    question["correct"] = verdict
+                    question["graded_by"] = "duplicate" if score == 1.0 else "near-duplicate"
+                    question["grade_confidence"] = round(score, 2)
+                else:
+                    print(f"  {question.get('question', '')[:60]!r}: {verdict} (similarity {score:.2f}, from {', '.join(sorted(set(sources)))})")
+        print(f"{filepath}: {matched} of {ungraded} ungraded replies match an earlier verdict")
+        if args.apply and matched:
+            save_results(filepath, data)
+
+if __name__ == "__main__":
+    main()
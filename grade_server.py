@@ -0,0 +1,390 @@
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from journal import Journal, read_journal
+from questions import question_id
+from reply_io import list_results_files, load_results, save_results
+
+# --- Configuration ---
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_INPUT_DIR = "replies"
+DEFAULT_OUTPUT_DIR = "rated-replies"
+DEFAULT_LEASE_SECONDS = 300  # A reviewer who walks away gives their item back after this long
+DEFAULT_FLUSH_INTERVAL = 10.0  # Seconds between writes of changed files to the output folder
+JOURNAL_NAME = ".grade_server.journal.jsonl"
+# Fields of a graded question carried over from the output copy while its reply is unchanged
+GRADE_FIELDS = ("correct", "graded_by", "grade_confidence", "reviewer")
+# --- End Configuration ---
+
+def question_key(question):
+    return question.get('id') or question_id(question.get('question', ''))
+
+def carry_grades(data, graded):
+    """Copy the grades in `graded` (the output copy) onto `data` where the question id and reply still match.
+
+    Returns how many grades were carried over.
+    """
+    previous = {question_key(question): question
+                for section in graded.get("sections", []) for question in section.get("questions", [])}
+    carried = 0
+    for section in data.get("sections", []):
+        for question in section.get("questions", []):
+            old = previous.get(question_key(question))
+            if old is None or old.get("correct") is None or old.get("reply") != question.get("reply"):
+                continue
+            for field in GRADE_FIELDS:
+                if field in old:
+                    question[field] = old[field]
+            if old.get("samples") and question.get("samples") and len(old["samples"]) == len(question["samples"]) \
+                    and all(a.get("reply") == b.get("reply") for a, b in zip(old["samples"], question["samples"])):
+                question["samples"] = old["samples"]
+            carried += 1
+    return carried
+
+class GradingQueue:
+    """Ungraded questions from many files, handed out to reviewers under time-limited leases.
+
+    Questions are read from the input folder. A grade in the output folder is
+    kept only while the question's reply is unchanged, so new replies are
+    graded again.
+    Verdicts are journaled (and fsync'd) as they arrive and written into the
+    output folder by `flush`, so a crash loses at most the open leases.
+    """
+    def __init__(self, input_dir, output_dir, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.output_dir = output_dir
+        self.lease_seconds = lease_seconds
+        self.lock = threading.Lock()        # Guards the queue, the leases and the counters
+        self.file_locks = {}                # output path -> lock held while a file is changed or written
+        self.documents = {}                 # output path -> {"model", "sections"} document
+        self.items = {}                     # (output path, question id) -> question dict
+        self.queue = deque()                # Keys of ungraded items not currently leased
+        self.leases = {}                    # lease id -> (key, reviewer, expiry)
+        self.leased = {}                    # key -> lease id
+        self.dirty = set()
+        self.graded = {}                    # reviewer -> verdicts given in this session
+        self.journal_path = os.path.join(output_dir, JOURNAL_NAME)
+
+        os.makedirs(output_dir, exist_ok=True)
+        for filepath in list_results_files(input_dir):
+            output_path = os.path.join(output_dir, os.path.basename(filepath))
+            try:
+                data = load_results(filepath)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not load '{filepath}': {e}")
+                continue
+            # Keep the grades of the output copy for replies that haven't changed since; new replies need grading
+            if os.path.exists(output_path):
+                try:
+                    carry_grades(data, load_results(output_path))
+                except (OSError, ValueError) as e:
+                    print(f"Warning: Could not load the grades in '{output_path}', skipping '{filepath}': {e}")
+                    continue
+            self.documents[output_path] = data
+            self.file_locks[output_path] = threading.Lock()
+            for section in data.get("sections", []):
+                for question in section.get("questions", []):
+                    self.items[(output_path, question_key(question))] = question
+
+        replayed = 0
+        for record in read_journal(self.journal_path):
+            question = self.items.get((record.get("file"), record.get("id")))
+            if question is not None:
+                self._apply(question, record["correct"], record.get("reviewer"))
+                self.dirty.add(record["file"])
+                replayed += 1
+        if replayed:
+            print(f"Recovered {replayed} verdict(s) from '{self.journal_path}'.")
+
+        # Questions a budget- or deadline-limited run never asked have nothing to grade
+        self.queue.extend(key for key, question in self.items.items()
+                          if question.get("correct") is None and not question.get("skipped"))
+        self.journal = Journal(self.journal_path, fsync_every=1)
+
+    @staticmethod
+    def _apply(question, verdict, reviewer):
+        question["correct"] = verdict
+        question["graded_by"] = "human"
+        question.pop("grade_confidence", None)
+        if reviewer:
+            question["reviewer"] = reviewer
+
+    def _expire_leases(self, now):
+        for lease_id, (key, _reviewer, expiry) in list(self.leases.items()):
+            if expiry <= now:
+                del self.leases[lease_id]
+                del self.leased[key]
+                if self.items[key].get("correct") is None:
+                    self.queue.appendleft(key)  # Back to the front: it has waited longest
+
+    def lease(self, reviewer):
+        """Hand the next ungraded item to `reviewer`. Returns the item dict or None when all are taken."""
+        now = time.monotonic()
+        with self.lock:
+            self._expire_leases(now)
+            while self.queue:
+                key = self.queue.popleft()
+                question = self.items[key]
+                if question.get("correct") is None and key not in self.leased:
+                    break
+            else:
+                return None
+            lease_id = uuid.uuid4().hex
+            self.leases[lease_id] = (key, reviewer, now + self.lease_seconds)
+            self.leased[key] = lease_id
+        output_path, qid = key
+        return {
+            "lease": lease_id,
+            "lease_seconds": self.lease_seconds,
+            "file": os.path.basename(output_path),
+            "model": self.documents[output_path].get("model", "Unknown Model"),
+            "id": qid,
+            "question": question.get("question", ""),
+            "expected_answer": question.get("expected_answer", ""),
+            "reply": question.get("reply") or "",
+        }
+
+    def release(self, lease_id):
+        """Give an item back without grading it (the reviewer skipped it)."""
+        with self.lock:
+            entry = self.leases.pop(lease_id, None)
+            if entry is None:
+                return False
+            del self.leased[entry[0]]
+            self.queue.append(entry[0])  # To the back, so the same reviewer doesn't get it again at once
+            return True
+
+    def record(self, lease_id, verdict, reviewer):
+        """Record a verdict for a leased item.
+
+        Returns "ok", "expired" if the lease is unknown and the item was handed
+        to someone else, or "graded" if another reviewer already graded it.
+        """
+        with self.lock:
+            entry = self.leases.get(lease_id)
+            if entry is None:
+                return "expired"
+            key = entry[0]
+        output_path, qid = key
+        with self.file_locks[output_path]:
+            question = self.items[key]
+            if question.get("correct") is not None:
+                return "graded"
+            self._apply(question, verdict, reviewer)
+            with self.lock:
+                # Journaled under the same lock flush() truncates with, so no verdict slips between
+                self.journal.append({"file": output_path, "id": qid, "correct": verdict,
+                                     "reviewer": reviewer, "time": time.time()})
+                self.leases.pop(lease_id, None)
+                self.leased.pop(key, None)
+                self.dirty.add(output_path)
+                self.graded[reviewer] = self.graded.get(reviewer, 0) + 1
+        return "ok"
+
+    def flush(self):
+        """Write every changed file to the output folder, then empty the journal if nothing changed meanwhile."""
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+        for output_path in sorted(dirty):
+            with self.file_locks[output_path]:
+                try:
+                    save_results(output_path, self.documents[output_path])
+                except OSError as e:
+                    print(f"Error: Could not write '{output_path}': {e}")
+                    with self.lock:
+                        self.dirty.add(output_path)
+        with self.lock:
+            # Every journaled verdict is now in its file, unless one arrived during the writes
+            if not self.dirty:
+                self.journal.close()
+                self.journal = Journal(self.journal_path, truncate=True, fsync_every=1)
+        return len(dirty)
+
+    def status(self):
+        with self.lock:
+            self._expire_leases(time.monotonic())
+            remaining = sum(1 for question in self.items.values() if question.get("correct") is None and not question.get("skipped"))
+            return {
+                "files": len(self.documents),
+                "questions": len(self.items),
+                "ungraded": remaining,
+                "leased": len(self.leases),
+                "reviewers": dict(self.graded),
+            }
+
+    def close(self):
+        self.flush()
+        self.journal.close()
+        if os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) == 0:
+            os.remove(self.journal_path)
+
+REVIEW_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Grading</title>
+<style>
+body { font-family: sans-serif; max-width: 60em; margin: 2em auto; }
+pre { white-space: pre-wrap; background: #f4f4f4; padding: 1em; }
+button { font-size: 1.2em; margin-right: 1em; }
+</style></head>
+<body>
+<p>Reviewer: <input id="reviewer"> <span id="status"></span></p>
+<div id="item"></div>
+<p><button onclick="send(true)">Correct (y)</button><button onclick="send(false)">Incorrect (n)</button><button onclick="skip()">Skip (s)</button></p>
+<script>
+let item = null;
+const reviewer = document.getElementById("reviewer");
+reviewer.value = localStorage.getItem("reviewer") || "";
+reviewer.onchange = () => localStorage.setItem("reviewer", reviewer.value);
+function esc(s) { const d = document.createElement("div"); d.textContent = s; return d.innerHTML; }
+async function next() {
+  const r = await fetch("/lease", {method: "POST", body: JSON.stringify({reviewer: reviewer.value})});
+  item = r.status === 200 ? await r.json() : null;
+  document.getElementById("item").innerHTML = item
+    ? `<p><b>${esc(item.model)}</b> (${esc(item.file)})</p><h3>${esc(item.question)}</h3>` +
+      `<p>Expected: <b>${esc(item.expected_answer)}</b></p><pre>${esc(item.reply)}</pre>`
+    : "<p>Nothing left to grade.</p>";
+  const s = await (await fetch("/status")).json();
+  document.getElementById("status").textContent = `${s.ungraded} ungraded, ${s.leased} in review`;
+}
+async function send(correct) {
+  if (!item) return next();
+  const r = await fetch("/verdict", {method: "POST", body: JSON.stringify({lease: item.lease, correct, reviewer: reviewer.value})});
+  if (r.status !== 200) alert((await r.json()).error);
+  next();
+}
+async function skip() {
+  if (item) await fetch("/release", {method: "POST", body: JSON.stringify({lease: item.lease})});
+  next();
+}
+document.onkeydown = (e) => {
+  if (e.target === reviewer) return;
+  if (e.key === "y") send(true); else if (e.key === "n") send(false); else if (e.key === "s") skip();
+};
+next();
+</script></body></html>
+"""
+
+class GradingHandler(BaseHTTPRequestHandler):
+    queue = None  # Set by serve()
+
+    def log_message(self, format, *args):
+        pass  # One line per request would drown the status output
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            return None
+        return payload if isinstance(payload, dict) else None
+
+    def do_GET(self):
+        if self.path == "/":
+            body = REVIEW_PAGE.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/status":
+            self.send_json(200, self.queue.status())
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        payload = self.read_json()
+        if payload is None:
+            self.send_json(400, {"error": "Expected a JSON object"})
+            return
+        reviewer = str(payload.get("reviewer") or "anonymous")
+        if self.path == "/lease":
+            item = self.queue.lease(reviewer)
+            if item is None:
+                self.send_response(204)  # Nothing left to hand out
+                self.end_headers()
+            else:
+                self.send_json(200, item)
+        elif self.path == "/verdict":
+            if not isinstance(payload.get("correct"), bool) or not payload.get("lease"):
+                self.send_json(400, {"error": "Expected 'lease' and a boolean 'correct'"})
+                return
+            result = self.queue.record(payload["lease"], payload["correct"], reviewer)
+            if result == "ok":
+                self.send_json(200, {"ok": True})
+            elif result == "graded":
+                self.send_json(409, {"error": "Another reviewer already graded this item"})
+            else:
+                self.send_json(409, {"error": "Lease expired; the item was handed to another reviewer"})
+        elif self.path == "/release":
+            self.send_json(200, {"ok": self.queue.release(payload.get("lease"))})
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+def serve(queue, host, port, flush_interval):
+    GradingHandler.queue = queue
+    server = ThreadingHTTPServer((host, port), GradingHandler)
+    server.daemon_threads = True
+    stop = threading.Event()
+
+    def flush_loop():
+        while not stop.wait(flush_interval):
+            written = queue.flush()
+            if written:
+                status = queue.status()
+                print(f"Saved {written} file(s); {status['ungraded']} of {status['questions']} questions still ungraded.")
+
+    flusher = threading.Thread(target=flush_loop, daemon=True)
+    flusher.start()
+    print(f"Grading server on http://{host}:{port}/ - open it in a browser, one tab per reviewer. Ctrl-C to stop.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping.")
+    finally:
+        stop.set()
+        flusher.join()
+        server.server_close()
+        queue.close()
+        for reviewer, count in sorted(queue.graded.items()):
+            print(f"  {reviewer}: {count} verdict(s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve ungraded replies to several reviewers at once over HTTP.")
+    parser.add_argument("--input-dir", default=DEFAULT_INPUT_DIR, help=f"Folder of replies files to grade (default: {DEFAULT_INPUT_DIR})")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help=f"Folder the graded files are written to (default: {DEFAULT_OUTPUT_DIR})")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Address to listen on; use 0.0.0.0 for other machines (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help=f"Seconds a reviewer holds an item before it goes back to the queue (default: {DEFAULT_LEASE_SECONDS})")
+    parser.add_argument("--flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL,
+                        help=f"Seconds between writes of graded files (default: {DEFAULT_FLUSH_INTERVAL})")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_dir):
+        print(f"Error: Input folder '{args.input_dir}' not found.")
+        sys.exit(1)
+    queue = GradingQueue(args.input_dir, args.output_dir, args.lease)
+    status = queue.status()
+    print(f"Loaded {status['files']} file(s): {status['ungraded']} of {status['questions']} questions ungraded.")
+    try:
+        serve(queue, args.host, args.port, args.flush_interval)
+    except OSError as e:
+        print(f"Error: Could not start the server: {e}")
+        queue.close()
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import json
+import time
+
+class Journal:
+    """Append-only JSONL file for crash-safe progress.
+
+    Every record is flushed to the OS as soon as it is appended, so a killed
+    process loses nothing. fsync, which is what protects against power loss,
+    is batched: it runs after every `fsync_every` records or `fsync_interval`
+    seconds, whichever comes first, and on close.
+    """
+    def __init__(self, path, truncate=False, fsync_every=16, fsync_interval=1.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.pending = 0
+        self.last_sync = time.monotonic()
+        self.f = open(path, 'w' if truncate else 'a', encoding='utf-8')
+
+    def append(self, record):
+        self.f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.f.flush()
+        self.pending += 1
+        if self.pending >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        if self.pending:
+            os.fsync(self.f.fileno())
+            self.pending = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if not self.f.closed:
+            self.sync()
+            self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def read_journal(path):
+    """Yield the records of a journal. A torn last line from a crash is skipped."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
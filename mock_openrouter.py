@@ -0,0 +1,254 @@
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Configuration ---
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8766
+DEFAULT_LATENCY = "lognormal:1.0,0.5"  # Seconds before the first token
+DEFAULT_TOKENS = 200                   # Completion tokens per reply
+DEFAULT_TOKENS_PER_SEC = 100.0         # Generation speed after the first token
+DEFAULT_RETRY_AFTER = 1.0              # Retry-After header sent with an injected 429
+PROMPT_TOKENS = 50                     # Prompt tokens per request, of which the system prompt is...
+SYSTEM_PROMPT_TOKENS = 40              # ...this many, reported as cached once the prompt has been seen
+# --- End Configuration ---
+
+CHAT_PATH = "/api/v1/chat/completions"
+
+def parse_latency(spec):
+    """Turn 'fixed:S', 'uniform:A,B', 'exp:MEAN' or 'lognormal:MEDIAN,SIGMA' into a sampler (seconds)."""
+    kind, _, params = spec.partition(":")
+    try:
+        values = [float(value) for value in params.split(",")] if params else []
+    except ValueError:
+        raise ValueError(f"Latency parameters must be numbers: '{spec}'")
+    samplers = {
+        "fixed": (1, lambda s: s[0]),
+        "uniform": (2, lambda s: random.uniform(s[0], s[1])),
+        "exp": (1, lambda s: random.expovariate(1 / s[0]) if s[0] > 0 else 0.0),
+        # Provider latencies are long-tailed; a lognormal with the median as scale fits them well
+        "lognormal": (2, lambda s: s[0] * random.lognormvariate(0, s[1])),
+    }
+    if kind not in samplers or len(values) != samplers[kind][0]:
+        raise ValueError(f"Unknown latency distribution '{spec}' (use fixed:S, uniform:A,B, exp:MEAN or lognormal:MEDIAN,SIGMA)")
+    sample = samplers[kind][1]
+    return lambda: max(0.0, sample(values))
+
+class MockStats:
+    """Counters for what the server has answered, served at GET /stats."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {"requests": 0, "ok": 0, "throttled": 0, "server_errors": 0, "streamed": 0, "in_flight": 0, "peak_in_flight": 0,
+                       "cached_prompt_tokens": 0}
+        self.prompts = set()  # (model, system prompt) pairs in the simulated prompt cache
+
+    def add(self, name, amount=1):
+        with self.lock:
+            self.counts[name] += amount
+            if name == "in_flight":
+                self.counts["peak_in_flight"] = max(self.counts["peak_in_flight"], self.counts["in_flight"])
+
+    def seen_prompt(self, key):
+        """Whether `key` is already in the prompt cache; adds it if not."""
+        with self.lock:
+            if key in self.prompts:
+                return True
+            self.prompts.add(key)
+            return False
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def reset(self):
+        with self.lock:
+            for name in self.counts:
+                if name != "in_flight":
+                    self.counts[name] = 0
+            self.prompts.clear()
+
+def system_prompt(request):
+    """(text, has a cache_control breakpoint) of a request's system message."""
+    for message in request.get("messages") or []:
+        if message.get("role") != "system":
+            continue
+        content = message.get("content")
+        if isinstance(content, list):
+            return "".join(part.get("text", "") for part in content), any("cache_control" in part for part in content)
+        return content or "", False
+    return "", False
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Answers Chat Completions requests the way OpenRouter does, after a sampled delay."""
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real API, so connection reuse is measured too
+    options = None  # Set by make_server()
+    stats = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=()):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self.send_json(200, self.stats.snapshot())
+        else:
+            self.send_json(404, {"error": {"code": 404, "message": "Not found"}})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path == "/stats/reset":
+            self.stats.reset()
+            self.send_json(200, {"ok": True})
+            return
+        if self.path != CHAT_PATH:
+            self.send_json(404, {"error": {"code": 404, "message": "Not found"}})
+            return
+        try:
+            request = json.loads(body)
+        except json.JSONDecodeError:
+            self.send_json(400, {"error": {"code": 400, "message": "Invalid JSON"}})
+            return
+
+        self.stats.add("requests")
+        self.stats.add("in_flight")
+        try:
+            self.answer(request)
+        finally:
+            self.stats.add("in_flight", -1)
+
+    def answer(self, request):
+        options = self.options
+        roll = random.random()
+        if roll < options.throttle_rate:
+            self.stats.add("throttled")
+            self.send_json(429, {"error": {"code": 429, "message": "Rate limit exceeded (mock)"}},
+                           [("Retry-After", f"{options.retry_after:g}")])
+            return
+        if roll < options.throttle_rate + options.error_rate:
+            self.stats.add("server_errors")
+            time.sleep(options.latency() / 2)  # Failing upstreams still take a while to fail
+            self.send_json(random.choice((500, 502, 503)), {"error": {"code": 502, "message": "Upstream error (mock)"}})
+            return
+
+        ttft = options.latency()
+        tokens = options.tokens
+        # Many providers behind OpenRouter ignore `n`; --ignore-n imitates them
+        n = 1 if options.ignore_n else max(1, int(request.get("n") or 1))
+        replies = [[f"sample{index}-token{i}" for i in range(tokens)] for index in range(n)]
+        # Like Anthropic, cache the system prompt only behind a cache_control breakpoint, unless --implicit-cache
+        text, marked = system_prompt(request)
+        cached = SYSTEM_PROMPT_TOKENS if (marked or options.implicit_cache) and self.stats.seen_prompt((request.get("model"), text)) else 0
+        self.stats.add("cached_prompt_tokens", cached)
+        usage = {"prompt_tokens": PROMPT_TOKENS, "completion_tokens": n * tokens, "total_tokens": PROMPT_TOKENS + n * tokens,
+                 "prompt_tokens_details": {"cached_tokens": cached},
+                 "completion_tokens_details": {"reasoning_tokens": 0},
+                 # Priced like a $1/$4 per million tokens model whose cached input costs a tenth
+                 "cost": round((PROMPT_TOKENS - cached + 0.1 * cached + 4 * n * tokens) * 1e-6, 8)}
+        generation_id = f"gen-mock-{random.getrandbits(48):012x}"
+        if not request.get("stream"):
+            time.sleep(ttft + tokens / options.tokens_per_sec)
+            self.stats.add("ok")
+            self.send_json(200, {
+                "id": generation_id,
+                "model": request.get("model"),
+                "provider": "Mock",
+                "choices": [{"index": index, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}
+                            for index, words in enumerate(replies)],
+                "usage": usage,
+            })
+            return
+
+        self.stats.add("streamed")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")  # No Content-Length, so the end of the body ends the stream
+        self.end_headers()
+        self.close_connection = True
+        self.wfile.write(b": OPENROUTER PROCESSING\n\n")
+        self.wfile.flush()
+        time.sleep(ttft)
+        interval = 1 / options.tokens_per_sec
+        for i in range(tokens):
+            chunk = {"id": generation_id, "model": request.get("model"), "provider": "Mock",
+                     "choices": [{"index": index, "delta": {"content": words[i] if i == 0 else " " + words[i]}}
+                                 for index, words in enumerate(replies)]}
+            if i == tokens - 1:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(interval)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.stats.add("ok")
+
+def make_server(host, port, options):
+    """Create (but don't start) a mock server. `options` needs latency, tokens, tokens_per_sec,
+    throttle_rate, error_rate, retry_after, ignore_n and implicit_cache attributes, like the parsed command line."""
+    handler = type("ConfiguredMockHandler", (MockHandler,), {"options": options, "stats": MockStats()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenRouter Chat Completions API, for load testing raiq.py.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Address to listen on (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on; 0 picks a free one (default: {DEFAULT_PORT})")
+    parser.add_argument("--latency", default=DEFAULT_LATENCY,
+                        help=f"Time to first token: fixed:S, uniform:A,B, exp:MEAN or lognormal:MEDIAN,SIGMA (default: {DEFAULT_LATENCY})")
+    parser.add_argument("--tokens", type=int, default=DEFAULT_TOKENS, help=f"Completion tokens per reply (default: {DEFAULT_TOKENS})")
+    parser.add_argument("--tokens-per-sec", type=float, default=DEFAULT_TOKENS_PER_SEC,
+                        help=f"Generation speed after the first token (default: {DEFAULT_TOKENS_PER_SEC:g})")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429 (default: 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 5xx (default: 0)")
+    parser.add_argument("--retry-after", type=float, default=DEFAULT_RETRY_AFTER,
+                        help=f"Retry-After seconds sent with a 429 (default: {DEFAULT_RETRY_AFTER:g})")
+    parser.add_argument("--ignore-n", action="store_true", help="Answer with one choice even when the request asks for n, like most providers")
+    parser.add_argument("--implicit-cache", action="store_true",
+                        help="Cache every repeated system prompt, like OpenAI and DeepSeek, not only those marked with cache_control")
+    parser.add_argument("--seed", type=int, help="Seed the random latencies and failures for repeatable runs")
+    return parser
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    try:
+        args.latency = parse_latency(args.latency)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.tokens < 1 or args.tokens_per_sec <= 0:
+        parser.error("--tokens and --tokens-per-sec must be positive")
+    if args.throttle_rate + args.error_rate > 1:
+        parser.error("--throttle-rate and --error-rate add up to more than 1")
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    try:
+        server = make_server(args.host, args.port, args)
+    except OSError as e:
+        print(f"Error: Could not start the mock server: {e}")
+        sys.exit(1)
+    host, port = server.server_address[:2]
+    # The benchmark reads this line to find the port
+    print(f"Mock OpenRouter listening on http://{host}:{port}{CHAT_PATH}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import os
+import pickle
+import hashlib
+from typing import NamedTuple
+
+DEFAULT_CACHE_DIR = ".questions_cache"
+CACHE_FORMAT = 1  # Bump when Question or the parse rules change
+
+class Question(NamedTuple):
+    id: str
+    section: str
+    question: str
+    expected_answer: str
+    line: int  # Line of the 'Q:' in the source file
+
+class QuestionFileError(ValueError):
+    """Raised when a questions file has problems; carries every diagnostic, not just the first."""
+    def __init__(self, file_path, diagnostics):
+        self.file_path = file_path
+        self.diagnostics = diagnostics
+        super().__init__("\n".join(f"{file_path}:{line}: {message}" for line, message in diagnostics))
+
+def question_id(question_text):
+    """Stable ID for a question, derived from its whitespace-normalized text."""
+    return hashlib.sha1(" ".join(question_text.split()).encode("utf-8")).hexdigest()[:12]
+
+def iter_questions(file_path, diagnostics=None):
+    """
+    Yield a Question for every Q:/A: pair, reading the file one line at a time.
+
+    A question or answer continues on the following lines until a blank line,
+    the next 'Q:'/'A:' or a '###' section header, so multi-line answers work.
+    Problems are appended to `diagnostics` as (line number, message) and the
+    offending entry is skipped.
+    """
+    if diagnostics is None:
+        diagnostics = []
+    section = None
+    field = None          # "Q" or "A": which field continuation lines belong to
+    q_line = None
+    q_parts, a_parts = [], []
+    seen_ids = {}
+
+    def finish():
+        if q_line is None:
+            return None
+        question = " ".join(q_parts).strip()
+        answer = "\n".join(a_parts).strip()
+        if not a_parts:
+            diagnostics.append((q_line, "Expected 'A:' after 'Q:'"))
+            return None
+        if not question:
+            diagnostics.append((q_line, "Empty question"))
+            return None
+        if section is None:
+            diagnostics.append((q_line, "Question appears before any '###' section header"))
+            return None
+        qid = question_id(question)
+        if qid in seen_ids:
+            diagnostics.append((q_line, f"Duplicate question (first seen on line {seen_ids[qid]})"))
+            return None
+        seen_ids[qid] = q_line
+        return Question(qid, section, question, answer, q_line)
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line_no, raw in enumerate(f, start=1):
+            line = raw.strip()
+            if line.startswith("###") or line.startswith("Q:"):
+                record = finish()
+                if record is not None:
+                    yield record
+                q_line, q_parts, a_parts, field = None, [], [], None
+                if line.startswith("###"):
+                    section = line[3:].strip()
+                    if not section:
+                        diagnostics.append((line_no, "Section header without a name"))
+                else:
+                    q_line, field = line_no, "Q"
+                    q_parts.append(line[2:].strip())
+            elif line.startswith("A:"):
+                if q_line is None:
+                    diagnostics.append((line_no, "'A:' without a preceding 'Q:'"))
+                    field = None
+                elif a_parts:
+                    diagnostics.append((line_no, "Second 'A:' for the same question"))
+                else:
+                    field = "A"
+                    a_parts.append(line[2:].strip())
+            elif not line:
+                field = None
+            elif field == "Q":
+                q_parts.append(line)
+            elif field == "A":
+                a_parts.append(line)
+        record = finish()
+        if record is not None:
+            yield record
+
+def file_digest(file_path):
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_questions(file_path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Return the list of Questions in a file, using a compiled cache keyed on the file hash.
+
+    Raises QuestionFileError with every diagnostic if the file has problems.
+    """
+    cache_path = None
+    if cache_dir:
+        cache_path = os.path.join(cache_dir, f"{file_digest(file_path)}.v{CACHE_FORMAT}.pickle")
+        try:
+            with open(cache_path, 'rb') as f:
+                return [Question(*fields) for fields in pickle.load(f)]
+        except (OSError, pickle.UnpicklingError, EOFError, TypeError):
+            pass
+
+    diagnostics = []
+    records = list(iter_questions(file_path, diagnostics))
+    if diagnostics:
+        raise QuestionFileError(file_path, diagnostics)
+
+    if cache_path is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = cache_path + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                # Plain tuples keep the cache loadable without importing this module's classes
+                pickle.dump([tuple(record) for record in records], f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Warning: Could not write questions cache: {e}")
+    return records
+
+def to_sections(records):
+    """Group Questions into the [{"section_name", "questions"}] structure used in results files."""
+    sections = []
+    by_name = {}
+    for record in records:
+        if record.section not in by_name:
+            by_name[record.section] = {"section_name": record.section, "questions": []}
+            sections.append(by_name[record.section])
+        by_name[record.section]["questions"].append(
+            {"id": record.id, "question": record.question, "expected_answer": record.expected_answer}
+        )
+    return sections
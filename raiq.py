@@ -1,74 +1,701 @@
 import os
+import copy
 import json
+import time
+import asyncio
 import requests
 import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 from dotenv import load_dotenv
+from journal import Journal, read_journal
+from questions import QuestionFileError, load_questions, to_sections
+from reply_io import save_results as write_results
+from reply_cache import DEFAULT_CACHE_PATH, ReplyCache, cache_key
+from ratelimit import (AdaptiveRateLimiter, RequestFailed, RetryStats, backoff_delay,
+                       is_retryable_status, parse_retry_after)
+from scheduler import DEFAULT_HISTORY_DIR, PrioritySemaphore, RunLimits, RunStopped, load_cost_model, parse_duration
+from telemetry import DEFAULT_METRICS_PATH, RunTelemetry, write_metrics_json, write_prometheus
+
+SYSTEM_PROMPT = (
+    "You're an expert in the indie horror game OMORI. "
+    "The question below was asked by a human. Be careful, as it could be a nonsensical question."
+)
+MAX_TOKENS = 4096  # Adjust as needed
+TEMPERATURE = 0.1  # Adjust as needed
+# Point OPENROUTER_API_URL (or --api-url) at a local server such as mock_openrouter.py to test without spending tokens
+API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+# Models whose providers only cache a prompt prefix when it carries a cache_control breakpoint;
+# OpenAI, DeepSeek and others cache long prefixes on their own
+CACHE_CONTROL_PREFIXES = ("anthropic/", "google/gemini")
+DEFAULT_POOL_SIZE = 10  # Connections kept alive by the session shared by callers that don't pass their own
 
 def parse_questions_file(file_path):
-    """Parse the .txt file to extract sections and question-answer pairs."""
+    """Parse the .txt file to extract sections and question-answer pairs.
+
+    Raises QuestionFileError listing every problem (with line numbers) in the file.
+    """
+    return to_sections(load_questions(file_path))
+
+# Seconds the current thread spent opening connections (TCP + TLS) during its last request
+_connect_time = threading.local()
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.monotonic()
+        super().connect()
+        _connect_time.seconds = getattr(_connect_time, "seconds", 0.0) + time.monotonic() - started
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.monotonic()
+        super().connect()
+        _connect_time.seconds = getattr(_connect_time, "seconds", 0.0) + time.monotonic() - started
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections record how long they took to open."""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+def create_session(pool_size):
+    """Create a Session whose keep-alive connection pool can serve `pool_size` requests at once."""
+    session = requests.Session()
+    adapter = TimedHTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+_default_session = None
+_default_session_lock = threading.Lock()
+
+def default_session():
+    """The keep-alive Session used when a caller doesn't pass one, so single calls reuse connections too."""
+    global _default_session
+    with _default_session_lock:
+        if _default_session is None:
+            _default_session = create_session(DEFAULT_POOL_SIZE)
+        return _default_session
+
+def supports_cache_control(model):
+    return model.startswith(CACHE_CONTROL_PREFIXES)
+
+class ChatRequest:
+    """Headers and JSON body of the requests to one model, with the constant part serialized once.
+
+    Only the question differs between requests, so the body is the cached
+    prefix, the JSON-encoded question and a fixed suffix. With `prompt_cache`
+    the system prompt of models in CACHE_CONTROL_PREFIXES is sent as a text
+    part with an ephemeral cache_control breakpoint, so the provider can bill
+    it at the cached-input rate once it has been seen.
+    """
+    def __init__(self, model, api_key, system_prompt=SYSTEM_PROMPT, temperature=TEMPERATURE, prompt_cache=True):
+        self.headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        system = {"role": "system", "content": system_prompt}
+        if prompt_cache and supports_cache_control(model):
+            system["content"] = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+        self.data = {
+            "model": model,
+            "max_tokens": MAX_TOKENS,
+            "temperature": temperature,
+            "usage": {"include": True},  # Ask OpenRouter to report the cost of the request
+            "messages": [system],
+        }
+        self.templates = {}  # (n, stream) -> (prefix, suffix) bytes
+
+    def template(self, n, stream):
+        template = self.templates.get((n, stream))
+        if template is None:
+            data = {key: value for key, value in self.data.items() if key != "messages"}
+            if n > 1:
+                data["n"] = n
+            if stream:
+                data["stream"] = True
+            # The user message goes last, so everything after its content is a fixed suffix
+            data["messages"] = self.data["messages"] + [{"role": "user", "content": ""}]
+            text = json.dumps(data)
+            template = (text[:-len('""}]}')].encode("utf-8"), b"}]}")
+            self.templates[(n, stream)] = template
+        return template
+
+    def body(self, question, n=1, stream=False):
+        prefix, suffix = self.template(n, stream)
+        return prefix + json.dumps(question).encode("utf-8") + suffix
+
+def check_api_error(payload):
+    """Raise RequestFailed if a response body or stream chunk carries an API error object."""
+    if "error" not in payload:
+        return
+    # OpenRouter reports some upstream provider errors with a 200 status
+    error = payload["error"]
     try:
-        with open(file_path, 'r') as f:
-            lines = f.readlines()
-        
-        sections = []
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            if line.startswith("###"):
-                section_name = line[3:].strip()
-                current_section = {"section_name": section_name, "questions": []}
-                sections.append(current_section)
-                i += 1
-            elif line.startswith("Q:"):
-                question = line[2:].strip()
-                i += 1
-                if i < len(lines) and lines[i].strip().startswith("A:"):
-                    answer = lines[i][2:].strip()
-                    current_section["questions"].append({"question": question, "expected_answer": answer})
-                    i += 1
-                else:
-                    raise ValueError(f"Expected 'A:' after 'Q:' at line {i}")
-            else:
-                i += 1
-        return sections
-    except Exception as e:
-        print(f"Error parsing questions file: {e}")
-        return []
-
-def get_llm_reply(model, question, api_key):
-    """Send a question to the OpenRouter LLM using the Chat Completions API."""
-    url = "https://openrouter.ai/api/v1/chat/completions"  # Confirm this endpoint
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    system_prompt = (
-        "You're an expert in the indie horror game OMORI. "
-        "The question below was asked by a human. Be careful, as it could be a nonsensical question."
-    )
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": question}
-    ]
-    data = {
-        "model": model,
-        "messages": messages,
-        "max_tokens": 4096,  # Adjust as needed
-        "temperature": 0.1  # Adjust as needed
+        status = int(error.get("code"))
+    except (AttributeError, TypeError, ValueError):
+        status = None
+    raise RequestFailed(f"API error: {error}", status=status, retryable=status is None or is_retryable_status(status))
+
+def iter_sse_data(response):
+    """Yield the data payload of each server-sent event as it arrives.
+
+    Comment lines (OpenRouter sends ': OPENROUTER PROCESSING' keep-alives)
+    are skipped, and multi-line data fields are joined as the SSE spec says.
+    """
+    # Event streams are always UTF-8; without a charset requests would assume ISO-8859-1
+    response.encoding = "utf-8"
+    data_lines = []
+    for line in response.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield "\n".join(data_lines)
+                data_lines = []
+        elif line.startswith(":"):
+            continue
+        elif line.startswith("data:"):
+            data_lines.append(line[5:].lstrip(" "))
+    if data_lines:
+        yield "\n".join(data_lines)
+
+def request_metrics(response, started, finished, first_token_at, usage, generation, connect, fallback_tokens=None):
+    """Timing, token usage and provider details of one successful request.
+
+    `generation` is the response body (or a stream chunk) carrying the
+    generation id and provider. Tokens/sec is measured from the first token
+    when it is known, otherwise over the whole request.
+    """
+    usage = usage or {}
+    completion_tokens = usage.get("completion_tokens") or fallback_tokens
+    generating = finished - (first_token_at if first_token_at is not None else started)
+    return {
+        "ttft": round(first_token_at - started, 3) if first_token_at is not None else None,
+        "latency": round(finished - started, 3),
+        "connect": round(connect, 3),
+        "ttfb": round(response.elapsed.total_seconds(), 3),
+        "status": response.status_code,
+        "provider": generation.get("provider"),
+        "generation_id": generation.get("id"),
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "completion_tokens": completion_tokens,
+        "reasoning_tokens": (usage.get("completion_tokens_details") or {}).get("reasoning_tokens"),
+        "cached_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens"),
+        "cost": usage.get("cost"),
+        "tokens_per_sec": round(completion_tokens / generating, 2) if completion_tokens and generating > 0 else None,
     }
-    reply = ""
+
+def read_streamed_replies(response, started, connect=0.0):
+    """Assemble the streamed completions (one per choice index) and measure them. Returns (replies, metrics)."""
+    parts = {}
+    first_token_at = None
+    chunks = 0
+    usage = None
+    generation = {}
+    for data in iter_sse_data(response):
+        if data == "[DONE]":
+            break
+        try:
+            chunk = json.loads(data)
+        except ValueError:
+            continue
+        check_api_error(chunk)
+        if not generation and chunk.get("id"):
+            generation = chunk
+        if chunk.get("usage"):
+            usage = chunk["usage"]
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+            # Reasoning tokens count towards time-to-first-token, but not towards the reply
+            if first_token_at is None and (delta.get("content") or delta.get("reasoning")):
+                first_token_at = time.monotonic()
+            if delta.get("content"):
+                parts.setdefault(choice.get("index", 0), []).append(delta["content"])
+                chunks += 1
+    finished = time.monotonic()
+    metrics = request_metrics(response, started, finished, first_token_at, usage, generation, connect, fallback_tokens=chunks)
+    return ["".join(parts[index]).strip() for index in sorted(parts)] or [""], metrics
+
+def get_llm_replies(model, question, api_key, session=None, stream=False, timeout=60, system_prompt=SYSTEM_PROMPT,
+                    api_url=None, n=1, temperature=TEMPERATURE, request=None):
+    """Send a question to the OpenRouter LLM using the Chat Completions API.
+
+    With `stream` the reply is read as server-sent events, and `timeout` is the
+    longest allowed gap between two chunks rather than a limit on the whole
+    reply. `api_url` defaults to API_URL. With `n` > 1 that many completions
+    are requested at once; providers that don't support `n` return fewer.
+    `request` is a ChatRequest to reuse; without one it is built from the
+    model, key, system prompt and temperature. Without a `session` the shared
+    default_session() is used.
+    Returns (replies, response headers, metrics). Raises RequestFailed when
+    no reply could be read.
+    """
+    url = api_url or API_URL
+    if request is None:
+        request = ChatRequest(model, api_key, system_prompt, temperature)
+    body = request.body(question, n, stream)
+    poster = session if session is not None else default_session()
+    _connect_time.seconds = 0.0
+    started = time.monotonic()
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=60)
-        response.raise_for_status()
-        reply = response.json()["choices"][0]["message"]["content"].strip()
+        response = poster.post(url, headers=request.headers, data=body, timeout=timeout, stream=stream)
     except requests.exceptions.RequestException as e:
-        print(f"HTTP request failed: {e}")
-    except KeyError:
-        print("Unexpected response format from the API")
+        # Connection errors and timeouts are usually transient
+        raise RequestFailed(f"HTTP request failed: {e}", retryable=True) from e
+    connect = _connect_time.seconds  # Still 0.0 when a kept-alive connection was reused
+
+    with response:
+        if response.status_code >= 400:
+            raise RequestFailed(
+                f"HTTP {response.status_code}: {response.text[:200]}",
+                status=response.status_code,
+                retryable=is_retryable_status(response.status_code),
+                retry_after=parse_retry_after(response.headers),
+            )
+        if stream:
+            try:
+                replies, metrics = read_streamed_replies(response, started, connect)
+            except requests.exceptions.RequestException as e:
+                # requests applies the read timeout per chunk, so this is the idle-gap timeout
+                raise RequestFailed(f"Stream interrupted: {e}", retryable=True) from e
+            return replies, response.headers, metrics
+
+        try:
+            payload = response.json()
+        except ValueError as e:
+            raise RequestFailed("Response body is not valid JSON", status=response.status_code, retryable=True) from e
+    check_api_error(payload)
+    try:
+        choices = sorted(payload["choices"], key=lambda choice: choice.get("index", 0))
+        replies = [choice["message"]["content"].strip() for choice in choices]
+    except (KeyError, TypeError, AttributeError) as e:
+        raise RequestFailed("Unexpected response format from the API", retryable=True) from e
+    if not replies:
+        raise RequestFailed("Unexpected response format from the API", retryable=True)
+
+    metrics = request_metrics(response, started, time.monotonic(), None, payload.get("usage"), payload, connect)
+    return replies, response.headers, metrics
+
+def get_llm_reply(model, question, api_key, session=None, stream=False, timeout=60, system_prompt=SYSTEM_PROMPT,
+                  api_url=None):
+    """Like get_llm_replies, for a single completion. Returns (reply, response headers, metrics)."""
+    replies, headers, metrics = get_llm_replies(model, question, api_key, session, stream, timeout, system_prompt, api_url)
+    return replies[0], headers, metrics
+
+def combine_metrics(batches):
+    """Metrics of one question answered by several requests: tokens and cost add up, latency is the slowest."""
+    combined = dict(batches[0])
+    for field in ("prompt_tokens", "completion_tokens", "reasoning_tokens", "cached_tokens", "cost", "retries"):
+        values = [metrics.get(field) for metrics in batches if metrics.get(field) is not None]
+        combined[field] = round(sum(values), 8) if values else None
+    combined["latency"] = max(metrics["latency"] for metrics in batches)
+    combined["requests"] = len(batches)
+    return combined
+
+class ModelClient:
+    """Everything needed to ask one model questions: shared session and pool, plus its own limits.
+
+    `semaphore` is the PrioritySemaphore shared by all models; `limits` is the
+    run's shared RunLimits and `cost_model` the CostModel requests are ordered by.
+    """
+    def __init__(self, model, api_key, session, semaphore, concurrency, rate, max_rate, max_retries,
+                 cache=None, read_cache=True, stream=False, timeout=60, api_url=None,
+                 cost_model=None, limits=None, temperature=TEMPERATURE, prompt_cache=True):
+        self.model = model
+        self.api_key = api_key
+        self.session = session
+        self.semaphore = semaphore
+        self.model_semaphore = asyncio.Semaphore(concurrency)
+        self.limiter = AdaptiveRateLimiter(rate, max_rate=max_rate)
+        self.stats = RetryStats()
+        self.max_retries = max_retries
+        self.cache = cache
+        self.read_cache = read_cache
+        self.cache_hits = 0
+        self.stream = stream
+        self.timeout = timeout
+        self.api_url = api_url
+        self.cost_model = cost_model
+        self.limits = limits
+        self.temperature = temperature
+        self.request = ChatRequest(model, api_key, SYSTEM_PROMPT, temperature, prompt_cache)
+        self.supports_n = True  # Until a response returns fewer choices than asked for
+
+    def expected(self, section_name, question):
+        """(expected latency, expected cost) of asking `question`, from earlier runs."""
+        if self.cost_model is None:
+            return 0.0, 0.0
+        return self.cost_model.expected(self.model, section_name, question["id"])
+
+    def _cache_key(self, question, sample=0):
+        return cache_key(self.model, SYSTEM_PROMPT, question, MAX_TOKENS, self.temperature, sample)
+
+    async def ask(self, question, expected=(0.0, 0.0)):
+        """Ask one question, backing off and retrying transient failures.
+
+        The reply cache is consulted before any network call. `expected` is
+        the (latency, cost) estimate used to prioritize the request and to
+        check it against the run's budget and deadline. Returns (reply,
+        metrics), where metrics is None for a cached reply. Raises
+        RequestFailed once the retries are used up or the error is permanent,
+        and RunStopped if the budget or deadline ran out first.
+        """
+        replies, metrics = await self.ask_samples(question, 1, expected)
+        return replies[0], metrics
+
+    async def ask_samples(self, question, samples, expected=(0.0, 0.0)):
+        """Get `samples` independent replies to one question, like `ask`.
+
+        Samples already in the cache are reused. The rest are requested in
+        one call with `n` while the provider honours it, and otherwise as
+        concurrent single requests. Returns (replies, metrics), where metrics
+        combines every request made and is None if all came from the cache.
+        """
+        keys = [self._cache_key(question, sample) for sample in range(samples)] if self.cache is not None else None
+        replies = [None] * samples
+        if keys is not None and self.read_cache:
+            for sample, key in enumerate(keys):
+                replies[sample] = self.cache.get(key)
+            self.cache_hits += sum(reply is not None for reply in replies)
+        missing = [sample for sample, reply in enumerate(replies) if reply is None]
+        batches = []
+
+        def store(sample, reply):
+            replies[sample] = reply
+            if keys is not None:
+                self.cache.put(keys[sample], self.model, question, reply)
+
+        if len(missing) > 1 and self.supports_n:
+            got, metrics = await self._request(question, (expected[0], expected[1] * len(missing)), n=len(missing))
+            batches.append(metrics)
+            if len(got) < len(missing):
+                self.supports_n = False  # The provider ignored `n`; fan out from now on
+            for sample, reply in zip(missing, got):
+                store(sample, reply)
+            missing = missing[len(got):]
+        async def fetch(sample):
+            # Each sample is cached as soon as it arrives, so a retry after a partial failure reuses it
+            got, metrics = await self._request(question, expected)
+            store(sample, got[0])
+            batches.append(metrics)
+
+        if missing:
+            await asyncio.gather(*(fetch(sample) for sample in missing))
+        return replies, combine_metrics(batches) if batches else None
+
+    async def _request(self, question, expected, n=1):
+        """One request (with retries) for `n` completions. Returns (replies, metrics)."""
+        for attempt in range(self.max_retries + 1):
+            # Wait on the per-model cap and rate first so a throttled model never holds pool slots
+            async with self.model_semaphore:
+                self.stats.throttle_seconds += await self.limiter.acquire()
+                async with self.semaphore.slot(expected[0]):
+                    # Reserved only once a slot is free, so the deadline is checked against the real start time
+                    if self.limits is not None:
+                        self.limits.reserve(*expected)
+                    actual_cost = None  # Cancelled mid-request: settle at the expected cost
+                    self.stats.requests += 1
+                    try:
+                        replies, headers, metrics = await asyncio.to_thread(
+                            get_llm_replies, self.model, question, self.api_key, self.session, self.stream, self.timeout,
+                            SYSTEM_PROMPT, self.api_url, n, self.temperature, self.request)
+                    except RequestFailed as e:
+                        error = e
+                        actual_cost = 0.0
+                        self.stats.count_status(e.status)
+                    else:
+                        self.stats.count_status(metrics["status"])
+                        metrics["retries"] = attempt
+                        actual_cost = metrics.get("cost")
+                        self.limiter.on_success(headers)
+                        return replies[:n], metrics
+                    finally:
+                        if self.limits is not None:
+                            self.limits.settle(expected[1], actual_cost)
+
+            if error.status == 429:
+                self.stats.throttled += 1
+                self.limiter.on_throttle(error.retry_after)
+            if not error.retryable or attempt == self.max_retries:
+                raise error
+            self.stats.retries += 1
+            delay = error.retry_after or backoff_delay(attempt)
+            self.stats.throttle_seconds += delay
+            await asyncio.sleep(delay)
+
+def read_models_file(file_path):
+    """Read OR model names from a file, one per line, skipping blank lines and '#' comments."""
+    with open(file_path, 'r') as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+def output_path_for_model(output_dir, model):
+    """Map an OR model name such as 'openai/gpt-4o' to '<output_dir>/gpt-4o.json'."""
+    file_name = model.split("/")[-1].replace(":", "_")
+    return os.path.join(output_dir, f"{file_name}.json")
+
+def output_paths_for_models(output_dir, models):
+    """{model: output path} for a sweep. Raises ValueError if two models would write the same file."""
+    paths = {model: output_path_for_model(output_dir, model) for model in models}
+    check_distinct_paths(paths)
+    return paths
+
+def check_distinct_paths(paths):
+    """Raise ValueError if two models in {model: path} share an output file."""
+    owners = {}
+    for model, path in paths.items():
+        owners.setdefault(os.path.normcase(os.path.abspath(path)), []).append(model)
+    clashes = [f"{', '.join(models)} -> {os.path.basename(path)}" for path, models in owners.items() if len(models) > 1]
+    if clashes:
+        raise ValueError("Several models would be saved to the same file: " + "; ".join(clashes))
+
+def save_results(output_file, model, sections):
+    """Write the {"model", "sections"} results document for a single model.
+
+    An output path ending in .jsonl gets the line-per-question format from reply_io.py.
+    """
+    result = {"model": model, "sections": sections}
+    try:
+        write_results(output_file, result)
+        print(f"Results saved to {output_file}")
+        return True
     except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-    
-    return reply
+        print(f"Failed to write results to file: {e}")
+        return False
+
+def journal_path_for(output_file):
+    """The checkpoint journal that sits next to an output file."""
+    return output_file + ".journal.jsonl"
+
+def load_checkpoint(journal_path, model):
+    """Read the replies a previous run of `model` journaled.
+
+    Returns {question id: (reply, metrics, samples)}.
+    """
+    completed = {}
+    for record in read_journal(journal_path):
+        if record.get("model") == model and record.get("reply") and record.get("id"):
+            completed[record["id"]] = (record["reply"], record.get("metrics"), record.get("samples"))
+    return completed
+
+def record_reply(question, reply, metrics=None, samples=None):
+    """Store a reply on its question dict in the output schema.
+
+    With repeated sampling every reply goes into "samples", each with its own
+    "correct"; "reply" and "correct" keep the first sample for the other tools.
+    """
+    question["reply"] = reply
+    question["correct"] = None  # Set to null as required
+    if metrics:
+        question["metrics"] = metrics
+    if samples:
+        question["samples"] = [{"reply": sample, "correct": None} for sample in samples]
+
+def record_skipped(question, reason):
+    """Mark a question the run stopped before asking, so no tool mistakes it for an empty reply."""
+    question["reply"] = None
+    question["correct"] = None
+    question["skipped"] = reason
+
+async def fetch_replies(client, sections, label="", journal=None, completed=None, telemetry=None, samples=1):
+    """Fill in a reply for every question of one model.
+
+    Replies are written into the question dicts themselves, so the original
+    section/question order is kept no matter which request finishes first.
+    Each reply is appended to `journal` as it arrives, and questions found in
+    `completed` (from a previous run's journal) are not asked again.
+    Questions that still fail after their retries are tried once more after
+    everything else is done; only then is an empty reply recorded.
+    Questions are started longest-expected-first, and the ones the run's
+    budget or deadline stopped are marked with "skipped".
+    Finished questions are counted in `telemetry`, which also shows progress.
+    With `samples` > 1 each question is answered that many times.
+    """
+    log = telemetry.log if telemetry is not None else print
+    total_questions = sum(len(section["questions"]) for section in sections)
+    completed_questions = 0
+    deferred = []
+    pending = []
+    for section in sections:
+        for question in section["questions"]:
+            checkpoint = (completed or {}).get(question["id"])
+            if checkpoint is None:
+                pending.append((section["section_name"], question))
+            else:
+                record_reply(question, *checkpoint)
+                completed_questions += 1
+                if telemetry is not None:
+                    telemetry.record(client.model)
+    expected = {question["id"]: client.expected(section_name, question) for section_name, question in pending}
+    # Longest first, so a slow question never starts last and stretches the run (sort is stable for ties)
+    pending.sort(key=lambda item: expected[item[1]["id"]][0], reverse=True)
+    if completed_questions:
+        log(f"{label}Resumed {completed_questions} / {total_questions} questions from the journal")
+
+    async def process(section_name, question, final_pass=False):
+        nonlocal completed_questions
+        metrics = None
+        replies = None
+        try:
+            if samples > 1:
+                replies, metrics = await client.ask_samples(question["question"], samples, expected[question["id"]])
+                reply = replies[0]
+            else:
+                reply, metrics = await client.ask(question["question"], expected[question["id"]])
+        except RunStopped as e:
+            record_skipped(question, e.reason)
+            if telemetry is not None:
+                telemetry.record(client.model, skipped=True)
+                telemetry.question_done(f"{label}Skipped Question ({section_name}): {e.reason} reached")
+            return
+        except RequestFailed as e:
+            if e.retryable and not final_pass:
+                deferred.append((section_name, question))
+                return
+            client.stats.failed += 1
+            log(f"{label}Question failed ({section_name}): {e}")
+            reply = ""
+            if telemetry is not None:
+                telemetry.record(client.model, failed=True)
+        else:
+            if journal is not None:
+                journal.append({"model": client.model, "id": question["id"], "section": section_name,
+                                "question": question["question"], "reply": reply, "metrics": metrics,
+                                "samples": replies})
+            if telemetry is not None:
+                telemetry.record(client.model, metrics)
+        record_reply(question, reply, metrics, replies)
+        completed_questions += 1
+        message = f"{label}Processed Question {completed_questions} / {total_questions} ({section_name})"
+        if telemetry is not None:
+            telemetry.question_done(message)
+        else:
+            print(message)
+
+    await asyncio.gather(*(process(section_name, question) for section_name, question in pending))
+    if deferred:
+        log(f"{label}Retrying {len(deferred)} failed question(s)")
+        await asyncio.gather(*(process(section_name, question, final_pass=True) for section_name, question in deferred))
+    return sections
+
+async def run_sweep(models, sections, api_key, output_paths, args, workers):
+    """Ask every model every question over one shared session and worker pool.
+
+    Each model gets its own deep copy of `sections`, rate limiter and at most
+    `args.concurrency` requests in flight; `workers` bounds the total across
+    all models. A model's results are saved to `output_paths[model]` as soon
+    as it finishes.
+    """
+    session = create_session(workers)
+    semaphore = PrioritySemaphore(workers)
+    # requests is blocking, so every in-flight request needs its own worker thread
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=workers))
+    cache = None if args.no_cache else ReplyCache(args.cache_path, args.cache_max_age, args.cache_max_size)
+    cost_model = load_cost_model(args.history_dir) if args.history_dir else None
+    limits = RunLimits(args.budget, args.deadline)
+    clients = {
+        model: ModelClient(model, api_key, session, semaphore, args.concurrency,
+                           args.rate, args.max_rate, args.max_retries,
+                           cache=cache, read_cache=not args.refresh,
+                           stream=args.stream, timeout=args.timeout, api_url=args.api_url,
+                           cost_model=cost_model, limits=limits, temperature=args.temperature,
+                           prompt_cache=not args.no_prompt_cache)
+        for model in models
+    }
+    telemetry = RunTelemetry(len(models) * sum(len(section["questions"]) for section in sections))
+
+    async def run_model(model):
+        model_sections = copy.deepcopy(sections)
+        label = f"[{model}] " if len(models) > 1 else ""
+        journal_path = journal_path_for(output_paths[model])
+        completed = load_checkpoint(journal_path, model) if args.resume else None
+        # A fresh run starts a fresh journal; --resume keeps appending to the old one
+        with Journal(journal_path, truncate=not args.resume) as journal:
+            await fetch_replies(clients[model], model_sections, label, journal, completed, telemetry, args.samples)
+        telemetry.finish()
+        skipped = sum(1 for section in model_sections for question in section["questions"] if question.get("skipped"))
+        if save_results(output_paths[model], model, model_sections):
+            if skipped:
+                # The journal is kept so --resume asks only the skipped questions
+                print(f"PARTIAL: {skipped} question(s) of {model} were skipped ({limits.stopped} reached) and are marked \"skipped\"."
+                      f" Rerun with --resume to finish them.")
+            else:
+                os.remove(journal_path)
+
+    try:
+        await asyncio.gather(*(run_model(model) for model in models))
+    finally:
+        session.close()
+        if cache is not None:
+            cache.close()
+
+    telemetry.finish()
+    print("\n--- Run Summary ---")
+    for model, client in clients.items():
+        print(f"{model}: cache hits: {client.cache_hits}, {client.stats.summary(client.limiter)}")
+    report = telemetry.report(clients, limits.stopped)
+    print(f"{report['completed']} questions in {report['seconds']:.1f}s ({report['questions_per_sec']} q/s), cost: ${report['cost']:.4f},"
+          f" cached prompt tokens: {report['cached_tokens']}")
+    try:
+        if args.metrics_out:
+            write_metrics_json(args.metrics_out, report)
+            print(f"Run metrics saved to {args.metrics_out}")
+        if args.prometheus:
+            write_prometheus(args.prometheus, report)
+            print(f"Prometheus metrics saved to {args.prometheus}")
+    except OSError as e:
+        print(f"Failed to write run metrics: {e}")
+
+def add_request_arguments(parser):
+    """Add the options that control how replies are requested, shared with reeval.py."""
+    parser.add_argument("--concurrency", type=int, default=8, help="Maximum number of requests in flight per model (default: 8)")
+    parser.add_argument("--workers", type=int, help="Maximum number of requests in flight across all models (default: concurrency x models)")
+    parser.add_argument("--rate", type=float, default=5.0, help="Initial requests per second per model; tuned automatically (default: 5)")
+    parser.add_argument("--max-rate", type=float, default=20.0, help="Upper bound for the tuned request rate per model (default: 20)")
+    parser.add_argument("--max-retries", type=int, default=4, help="Retries per question before it is deferred to the end of the run (default: 4)")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH, help=f"SQLite reply cache location (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--cache-max-age", type=float, default=90, help="Drop cached replies older than this many days; 0 keeps them forever (default: 90)")
+    parser.add_argument("--cache-max-size", type=float, default=256, help="Evict least recently used replies above this many MB; 0 means unbounded (default: 256)")
+    parser.add_argument("--stream", action="store_true", help="Stream replies (SSE) and record time-to-first-token and tokens/sec per question")
+    parser.add_argument("--timeout", type=float, default=60, help="Seconds to wait for the server; with --stream, the longest allowed gap between chunks (default: 60)")
+    parser.add_argument("--api-url", default=API_URL, help=f"Chat Completions endpoint; also settable with OPENROUTER_API_URL (default: {API_URL})")
+    parser.add_argument("--metrics-out", default=DEFAULT_METRICS_PATH,
+                        help=f"Write run-level metrics (tokens, cost, latency percentiles, retries) as JSON here; '' to skip (default: {DEFAULT_METRICS_PATH})")
+    parser.add_argument("--prometheus", help="Also write the run metrics in Prometheus text format to this file")
+    parser.add_argument("--samples", type=int, default=1,
+                        help="Replies per question, for pass@k and agreement in rate_llms.py; requested with `n` where the provider supports it (default: 1)")
+    parser.add_argument("--temperature", type=float, default=TEMPERATURE,
+                        help=f"Sampling temperature; raise it with --samples so the samples differ (default: {TEMPERATURE})")
+    parser.add_argument("--no-prompt-cache", action="store_true",
+                        help="Don't mark the system prompt with cache_control for Anthropic and Gemini models")
+    parser.add_argument("--budget", type=float, help="Stop sending requests once this much (USD, as reported by OpenRouter) is spent or reserved")
+    parser.add_argument("--deadline", type=parse_duration, help="Don't start requests that can't finish within this time, e.g. 45m or 2h")
+    parser.add_argument("--history-dir", default=DEFAULT_HISTORY_DIR,
+                        help=f"Earlier replies used to estimate latency and cost and to start the slowest questions first; '' to keep file order (default: {DEFAULT_HISTORY_DIR})")
+    cache_mode = parser.add_mutually_exclusive_group()
+    cache_mode.add_argument("--no-cache", action="store_true", help="Neither read nor write the reply cache")
+    cache_mode.add_argument("--refresh", action="store_true", help="Ignore cached replies but store the fresh ones")
+
+def check_request_arguments(parser, args):
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.rate <= 0 or args.max_rate < args.rate:
+        parser.error("--rate must be positive and no larger than --max-rate")
+    if args.samples < 1:
+        parser.error("--samples must be at least 1")
+    if args.max_retries < 0:
+        parser.error("--max-retries cannot be negative")
 
 def main():
     # Load environment variables from .env file
@@ -76,22 +703,52 @@ def main():
     
     # Parse command-line arguments
     parser = argparse.ArgumentParser(description="Send questions to an LLM and save results to JSON")
-    parser.add_argument("--model", required=True, help="OR model name (e.g., 'provider/model-v1.4')")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--model", help="OR model name (e.g., 'provider/model-v1.4')")
+    target.add_argument("--models-file", help="Sweep every model listed in this file (e.g., OR_models.txt)")
     parser.add_argument("--input", required=True, help="Path to the input .txt file")
-    parser.add_argument("--output", required=True, help="Path to the output JSON file")
+    parser.add_argument("--output", help="Path to the output .json or .jsonl file (single-model mode)")
+    parser.add_argument("--output-dir", default="replies", help="Directory for per-model JSON files in sweep mode (default: replies)")
+    add_request_arguments(parser)
+    parser.add_argument("--resume", action="store_true", help="Skip questions already recorded in the checkpoint journal of an interrupted run")
     args = parser.parse_args()
-    
-    model = args.model
+    check_request_arguments(parser, args)
+    if args.model and not args.output:
+        parser.error("--output is required together with --model")
+    if args.models_file and args.output:
+        parser.error("--output cannot be used with --models-file; use --output-dir")
+
     input_file = args.input
-    output_file = args.output
+    if args.models_file:
+        models = read_models_file(args.models_file)
+        if not models:
+            print(f"No models found in {args.models_file}. Exiting.")
+            return
+        try:
+            output_paths = output_paths_for_models(args.output_dir, models)
+        except ValueError as e:
+            print(f"Error: {e}")
+            return
+        os.makedirs(args.output_dir, exist_ok=True)
+    else:
+        models = [args.model]
+        output_paths = {args.model: args.output}
+    workers = args.workers or args.concurrency * len(models)
     
     # Get API key from environment
     api_key = os.getenv("OPENROUTER_KEY")
     if not api_key:
         raise ValueError("Please set the OPENROUTER_KEY environment variable in your .env file.")
     
-    # Parse questions and get LLM replies
-    sections = parse_questions_file(input_file)
+    # Parse questions once and get LLM replies for every model
+    try:
+        sections = parse_questions_file(input_file)
+    except QuestionFileError as e:
+        print(f"Error parsing questions file:\n{e}")
+        return
+    except OSError as e:
+        print(f"Error reading questions file: {e}")
+        return
     if not sections:
         print("No sections found. Exiting.")
         return
@@ -99,36 +756,15 @@ def main():
     # Calculate total number of questions
     total_questions = sum(len(section["questions"]) for section in sections)
     print(f"Total Questions: {total_questions}")
-
-    completed_questions = 0
-    current_section_name = None  # Track the current section name
-
     for section in sections:
-        section_name = section["section_name"]
-
-        # Output section change message
-        if current_section_name is None:
-            print(f"SECTION: {section_name}")
-        else:
-            print(f"NEXT SECTION: {section_name}")
-
-        current_section_name = section_name  # Update the current section name
+        print(f"SECTION: {section['section_name']} ({len(section['questions'])} questions)")
+    if len(models) > 1:
+        print(f"Models: {len(models)} ({total_questions * len(models)} requests, {workers} workers)")
 
-        for question in section["questions"]:
-            reply = get_llm_reply(model, question["question"], api_key)
-            completed_questions += 1
-            print(f"Processed Question {completed_questions} / {total_questions}")
-            question["reply"] = reply
-            question["correct"] = None  # Set to null as required
-    
-    # Save results to JSON
-    result = {"model": model, "sections": sections}
     try:
-        with open(output_file, 'w') as f:
-            json.dump(result, f, indent=4)
-        print(f"Results saved to {output_file}")
-    except Exception as e:
-        print(f"Failed to write results to file: {e}")
+        asyncio.run(run_sweep(models, sections, api_key, output_paths, args, workers))
+    except KeyboardInterrupt:
+        print("\nInterrupted. Replies received so far are in the checkpoint journal; rerun with --resume to continue.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,18 +1,103 @@
 import os
+import sys
+import html
 import json
-import matplotlib.pyplot as plt
+import math
+import argparse
+import hashlib
 import numpy as np
 import re # For cleaning up names potentially
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from results_index import ResultsIndex
 
 # --- Configuration ---
 # <<< CHANGE THIS >>> Set the path to the folder containing your JSON files
 JSON_FOLDER_PATH = './rated-replies'
 # <<< CHANGE THIS (Optional) >>> Set the desired output filename for the plot
 OUTPUT_FILENAME = 'llm_performance_comparison.png'
+# Folder for --report: every chart plus report.html, report.md and the accuracy history
+REPORT_DIR = 'report'
+# Compact index of graded results, so reply bodies are only parsed when a file changes
+INDEX_PATH = '.results_index.sqlite'
 # Sections found in JSONs but not listed here will be added alphabetically at the end.
 SECTION_ORDER = ["EASY", "NORMAL", "HARD", "VERY HARD"]
+# Bootstrap resamples per section for the confidence intervals drawn as error bars
+BOOTSTRAP_RESAMPLES = 5000
+CONFIDENCE_LEVEL = 0.95
+# Model pairs whose McNemar p-value is below this are reported as significantly different
+SIGNIFICANCE_LEVEL = 0.05
+PLOT_DPI = 300
+PLOT_FORMAT = 'png'   # Or 'svg' / 'pdf'
+LANGUAGE = 'ru'       # Chart and report labels, a key of LABELS
 # --- End Configuration ---
 
+LABELS = {
+    "ru": {
+        "accuracy": "Результативность (%)",
+        "sections_title": "Результативность Больших Языковых Моделей",
+        "models": "Использованные БЯМ",
+        "heatmap_title": "Ответы моделей по вопросам",
+        "correct": "Верно",
+        "wrong": "Неверно",
+        "missing": "Нет ответа",
+        "scatter_title": "Результативность, время и стоимость",
+        "latency": "Медианное время ответа (с)",
+        "cost": "Средняя стоимость вопроса ($)",
+        "no_data": "Нет данных",
+        "trends_title": "Результативность по прогонам",
+        "date": "Дата",
+        "report_title": "Сравнение Больших Языковых Моделей",
+        "generated": "Создан",
+        "overall": "Всего",
+        "model": "Модель",
+        "significant": "Значимо различающиеся пары моделей (тест Макнемара, p < {level})",
+        "none": "Нет",
+        "sampling": "Повторные ответы",
+        "majority": "Большинство",
+        "agreement": "Согласие",
+        "questions": "Вопросов",
+        "undecided": "Исключено (не все ответы оценены)",
+    },
+    "en": {
+        "accuracy": "Accuracy (%)",
+        "sections_title": "Large Language Model Accuracy",
+        "models": "Models",
+        "heatmap_title": "Model answers by question",
+        "correct": "Correct",
+        "wrong": "Wrong",
+        "missing": "No answer",
+        "scatter_title": "Accuracy versus latency and cost",
+        "latency": "Median latency (s)",
+        "cost": "Mean cost per question ($)",
+        "no_data": "No data",
+        "trends_title": "Accuracy across runs",
+        "date": "Date",
+        "report_title": "Large Language Model Comparison",
+        "generated": "Generated",
+        "overall": "Overall",
+        "model": "Model",
+        "significant": "Significantly different model pairs (McNemar, p < {level})",
+        "none": "None",
+        "sampling": "Repeated sampling",
+        "majority": "Majority vote",
+        "agreement": "Agreement",
+        "questions": "Questions",
+        "undecided": "Left out (ungraded samples)",
+    },
+}
+
+def load_pyplot():
+    """Import pyplot on first use, with the non-interactive Agg backend.
+
+    Importing matplotlib takes longer than scoring, so runs that only print
+    scores never pay for it.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
 def clean_name(name):
     """Removes potentially problematic characters for display."""
     # Example: remove provider prefix if present like 'provider/'
@@ -21,63 +106,133 @@ def clean_name(name):
     name = re.sub(r':.*', '', name)
     return name.strip()
 
-def calculate_scores(filepath):
+def build_score_matrix(rows):
     """
-    Reads a JSON file and calculates the percentage of correct answers per section.
+    Builds dense models x questions matrices from results index rows.
 
     Args:
-        filepath (str): The path to the JSON file.
+        rows (list): Result rows from ResultsIndex.rows(), at most one file per model.
 
     Returns:
-        tuple: (model_name, section_scores) or (None, None) if error.
-               section_scores is a dictionary {section_name: percentage_correct}.
+        tuple: (models, question_sections, correct, answered)
+               models is the list of model names (matrix rows),
+               question_sections gives the section name of every question (matrix columns),
+               correct is a bool array that is True where a reply was graded correct,
+               answered is a bool array that is True where the model's file contains the question.
+    """
+    model_rows, question_cols = {}, {}
+    row_idx, col_idx, values = [], [], []
+    for _path, model, section, _section_pos, _question_pos, question_id, correct, _latency, _cost in rows:
+        row_idx.append(model_rows.setdefault(model, len(model_rows)))
+        col_idx.append(question_cols.setdefault((section, question_id), len(question_cols)))
+        values.append(correct == 1)
+
+    correct = np.zeros((len(model_rows), len(question_cols)), dtype=bool)
+    answered = np.zeros_like(correct)
+    answered[row_idx, col_idx] = True
+    correct[row_idx, col_idx] = values
+    question_sections = [section for section, _question_id in question_cols]
+    return list(model_rows), question_sections, correct, answered
+
+def section_onehot(question_sections, section_names):
+    """Questions x sections indicator matrix."""
+    return np.array(question_sections)[:, None] == np.array(section_names)[None, :]
+
+def section_accuracy(correct, answered, onehot):
+    """Percentage correct per model and section (models x sections), as one matrix product."""
+    hits = (correct & answered).astype(np.float64) @ onehot
+    totals = answered.astype(np.float64) @ onehot
+    return np.divide(100 * hits, totals, out=np.zeros_like(hits), where=totals > 0)
+
+def bootstrap_section_ci(correct, answered, onehot, n_resamples, confidence, seed=0):
     """
+    Percentile bootstrap confidence intervals for section accuracy.
+
+    Questions are resampled with replacement within each section, and every
+    model is scored on the same resamples. Each resample is a row of
+    per-question weights, so all resamples of a section are scored with a
+    single matrix product.
+
+    Returns:
+        tuple: (lower, upper) arrays (models x sections) in percent.
+    """
+    rng = np.random.default_rng(seed)
+    num_models, num_sections = correct.shape[0], onehot.shape[1]
+    lower = np.zeros((num_models, num_sections))
+    upper = np.zeros((num_models, num_sections))
+    tail = (1 - confidence) / 2 * 100
+    for j in range(num_sections):
+        cols = np.flatnonzero(onehot[:, j])
+        if cols.size == 0:
+            continue
+        # weights[b, q] = how often question q was drawn in resample b
+        weights = rng.multinomial(cols.size, np.full(cols.size, 1 / cols.size), size=n_resamples).astype(np.float64)
+        hits = (correct[:, cols] & answered[:, cols]).astype(np.float64) @ weights.T
+        totals = answered[:, cols].astype(np.float64) @ weights.T
+        scores = np.divide(100 * hits, totals, out=np.zeros_like(hits), where=totals > 0)
+        lower[:, j], upper[:, j] = np.percentile(scores, [tail, 100 - tail], axis=1)
+    return lower, upper
+
+def mcnemar_pvalues(correct, answered):
+    """
+    Exact McNemar test for every pair of models over the questions both answered.
+
+    Returns:
+        np.ndarray: models x models matrix of two-sided p-values.
+    """
+    right = (correct & answered).astype(np.int64)
+    wrong = (answered & ~correct).astype(np.int64)
+    only_row_right = right @ wrong.T  # [i, j]: questions i got right and j got wrong
+    discordant = only_row_right + only_row_right.T
+    smaller = np.minimum(only_row_right, only_row_right.T)
+
+    # Two-sided binomial(n, 0.5) tail probabilities, in log space so thousands of discordant pairs don't overflow,
+    # and only for the (n, smaller) pairs that occur
+    max_n = int(discordant.max()) if discordant.size else 0
+    log_factorial = np.array([math.lgamma(i + 1) for i in range(max_n + 1)])
+    pvalues = np.ones(discordant.shape)
+    for n, k in {(int(n), int(k)) for n, k in zip(discordant.ravel(), smaller.ravel())}:
+        if n == 0:
+            continue
+        ks = np.arange(k + 1)
+        log_pmf = log_factorial[n] - log_factorial[ks] - log_factorial[n - ks] - n * math.log(2)
+        top = log_pmf.max()
+        tail = math.exp(top + math.log(np.exp(log_pmf - top).sum()))
+        pvalues[(discordant == n) & (smaller == k)] = min(1.0, 2 * tail)
+    return pvalues
+
+def order_sections(section_names, section_order):
+    """Sections in `section_order` first, then any others alphabetically."""
+    # --- Custom Sorting Logic ---
+    sorted_section_names = []
+    remaining_sections = set(section_names) # Start with all found sections
+
+    # Add sections based on the defined order first
+    for section_name in section_order:
+        if section_name in remaining_sections:
+            sorted_section_names.append(section_name)
+            remaining_sections.remove(section_name) # Remove it so it's not added again
+
+    # Add any remaining sections (not in section_order) alphabetically at the end
+    if remaining_sections:
+        print(f"Note: Sections not in defined SECTION_ORDER found: {', '.join(sorted(list(remaining_sections)))}. Adding them to the end of the plot.")
+        sorted_section_names.extend(sorted(list(remaining_sections)))
+    # --- End Custom Sorting Logic ---
+    return sorted_section_names
+
+def save_figure(plt, fig, output_filename, dpi):
+    """Save and close a figure. Returns True if it was saved."""
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-
-        model_name = data.get('model', 'Unknown Model')
-        sections_data = data.get('sections', [])
-        section_scores = {}
-
-        if not sections_data:
-            print(f"Warning: No sections found in {filepath}")
-            return model_name, {}
-
-        for section in sections_data:
-            section_name = section.get('section_name', 'Unnamed Section')
-            questions = section.get('questions', [])
-
-            if not questions:
-                # Handle sections with no questions if necessary (e.g., assign 0% or skip)
-                section_scores[section_name] = 0.0
-                print(f"Warning: No questions found in section '{section_name}' in file {filepath}")
-                continue
-
-            correct_count = 0
-            total_count = len(questions)
-
-            for question in questions:
-                # Check explicitly for True, as 'correct' could be other things
-                if question.get('correct') is True:
-                    correct_count += 1
-
-            percentage = (correct_count / total_count) * 100 if total_count > 0 else 0.0
-            section_scores[section_name] = percentage
-
-        return model_name, section_scores
-
-    except FileNotFoundError:
-        print(f"Error: File not found - {filepath}")
-        return None, None
-    except json.JSONDecodeError:
-        print(f"Error: Could not decode JSON from - {filepath}")
-        return None, None
+        fig.savefig(output_filename, dpi=dpi, bbox_inches='tight')
+        print(f"Plot saved successfully to: {output_filename}")
+        return True
     except Exception as e:
-        print(f"An unexpected error occurred while processing {filepath}: {e}")
-        return None, None
+        print(f"Error saving plot: {e}")
+        return False
+    finally:
+        plt.close(fig)
 
-def plot_results(all_results, section_order, output_filename):
+def plot_results(all_results, section_order, output_filename, error_bars=None, labels=None, dpi=PLOT_DPI):
     """
     Generates and saves a grouped bar chart of the LLM performance,
     ordering sections based on the provided list.
@@ -85,11 +240,18 @@ def plot_results(all_results, section_order, output_filename):
     Args:
         all_results (dict): {model_name: {section_name: score}}.
         section_order (list): The desired order of section names for the x-axis.
-        output_filename (str): The name for the output PNG file.
+        output_filename (str): The output file; its extension picks the format.
+        error_bars (dict, optional): {model_name: {section_name: (lower, upper)}} confidence intervals.
+        labels (dict, optional): Chart text, one of LABELS (default: LABELS[LANGUAGE]).
+        dpi (int, optional): Resolution of raster formats.
+
+    Returns:
+        bool: True if the chart was saved.
     """
     if not all_results:
         print("No results to plot.")
         return
+    labels = labels or LABELS[LANGUAGE]
 
     # --- Data Preparation for Plotting ---
     models = list(all_results.keys())
@@ -99,23 +261,7 @@ def plot_results(all_results, section_order, output_filename):
     all_section_names_from_data = set()
     for sections in all_results.values():
         all_section_names_from_data.update(sections.keys())
-
-    # --- Custom Sorting Logic ---
-    sorted_section_names = []
-    remaining_sections = set(all_section_names_from_data) # Start with all found sections
-
-    # Add sections based on the defined order first
-    for section_name in section_order:
-        if section_name in remaining_sections:
-            sorted_section_names.append(section_name)
-            remaining_sections.remove(section_name) # Remove it so it's not added again
-
-    # Add any remaining sections (not in section_order) alphabetically at the end
-    if remaining_sections:
-        print(f"Note: Sections not in defined SECTION_ORDER found: {', '.join(sorted(list(remaining_sections)))}. Adding them to the end of the plot.")
-        sorted_section_names.extend(sorted(list(remaining_sections)))
-    # --- End Custom Sorting Logic ---
-
+    sorted_section_names = order_sections(all_section_names_from_data, section_order)
 
     if not sorted_section_names:
         print("No sections found across all files to plot.")
@@ -129,6 +275,7 @@ def plot_results(all_results, section_order, output_filename):
             scores_by_model[model].append(score)
 
     # --- Plotting (Mostly unchanged from before) ---
+    plt = load_pyplot()
     num_sections = len(sorted_section_names)
     num_models = len(models)
     x = np.arange(num_sections)
@@ -139,58 +286,419 @@ def plot_results(all_results, section_order, output_filename):
 
     for i, model in enumerate(models):
         offset = group_offset + i * width
-        rects = ax.bar(x + offset, scores_by_model[model], width, label=model_display_names[model])
+        yerr = None
+        if error_bars and model in error_bars:
+            intervals = [error_bars[model].get(section_name, (score, score))
+                         for section_name, score in zip(sorted_section_names, scores_by_model[model])]
+            yerr = [[max(0.0, score - low) for score, (low, _high) in zip(scores_by_model[model], intervals)],
+                    [max(0.0, high - score) for score, (_low, high) in zip(scores_by_model[model], intervals)]]
+        rects = ax.bar(x + offset, scores_by_model[model], width, label=model_display_names[model],
+                       yerr=yerr, capsize=2, error_kw={'elinewidth': 0.8})
         # Optional: ax.bar_label(rects, padding=3, fmt='%.1f')
 
-    ax.set_ylabel('Результативность (%)')
-    ax.set_title('Результативность Больших Языковых Моделей')
+    ax.set_ylabel(labels["accuracy"])
+    ax.set_title(labels["sections_title"])
     ax.set_xticks(x, sorted_section_names) # Use the correctly ordered section names
-    ax.legend(title="Использованные БЯМ", bbox_to_anchor=(1.05, 1), loc='upper left')
+    ax.legend(title=labels["models"], bbox_to_anchor=(1.05, 1), loc='upper left')
     ax.set_ylim(0, 105)
     ax.grid(axis='y', linestyle='--', alpha=0.7)
 
-    plt.xticks(rotation=45, ha='right')
+    plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
     fig.tight_layout()
+    return save_figure(plt, fig, output_filename, dpi)
+
+def plot_heatmap(models, question_sections, correct, answered, output_filename, labels=None, dpi=PLOT_DPI):
+    """Models x questions grid of correct, wrong and missing answers, best model on top, sections in file order."""
+    labels = labels or LABELS[LANGUAGE]
+    plt = load_pyplot()
+    from matplotlib.colors import ListedColormap
+    from matplotlib.patches import Patch
+
+    overall = section_accuracy(correct, answered, np.ones((correct.shape[1], 1), dtype=bool))[:, 0]
+    order = np.argsort(-overall, kind="stable")
+    # 0 = missing, 1 = wrong, 2 = correct
+    grid = np.where(answered, np.where(correct, 2, 1), 0)[order]
+    colors = ["#d9d9d9", "#d62728", "#2ca02c"]
+
+    fig, ax = plt.subplots(figsize=(min(40, max(10, grid.shape[1] * 0.03)), max(3, len(models) * 0.4 + 1.5)))
+    ax.imshow(grid, aspect="auto", interpolation="nearest", cmap=ListedColormap(colors), vmin=0, vmax=2)
+    ax.set_yticks(np.arange(len(models)), [f"{clean_name(models[i])} ({overall[i]:.0f}%)" for i in order])
+
+    # One tick per section, at its middle, with lines between sections
+    starts = [q for q in range(len(question_sections)) if q == 0 or question_sections[q] != question_sections[q - 1]]
+    ends = starts[1:] + [len(question_sections)]
+    ax.set_xticks([(start + end - 1) / 2 for start, end in zip(starts, ends)], [question_sections[start] for start in starts])
+    for start in starts[1:]:
+        ax.axvline(start - 0.5, color="black", linewidth=0.8)
+    ax.set_title(labels["heatmap_title"])
+    ax.legend(handles=[Patch(color=colors[2], label=labels["correct"]), Patch(color=colors[1], label=labels["wrong"]),
+                       Patch(color=colors[0], label=labels["missing"])],
+              bbox_to_anchor=(1.01, 1), loc='upper left')
+    fig.tight_layout()
+    return save_figure(plt, fig, output_filename, dpi)
 
-    # --- Save Plot ---
-    try:
-        plt.savefig(output_filename, dpi=300, bbox_inches='tight')
-        print(f"\nPlot saved successfully to: {output_filename}")
-    except Exception as e:
-        print(f"\nError saving plot: {e}")
+def plot_scatter(points, output_filename, labels=None, dpi=PLOT_DPI):
+    """Overall accuracy against median latency and against mean cost per question.
 
-    # Optional: plt.show()
+    Args:
+        points (dict): {model_name: {"accuracy": %, "latency": seconds or None, "cost": credits or None}}.
+    """
+    labels = labels or LABELS[LANGUAGE]
+    plt = load_pyplot()
+    fig, axes = plt.subplots(1, 2, figsize=(14, 6))
+    for ax, field in zip(axes, ("latency", "cost")):
+        known = {model: point for model, point in points.items() if point[field] is not None}
+        ax.set_xlabel(labels[field])
+        ax.set_ylabel(labels["accuracy"])
+        ax.grid(linestyle='--', alpha=0.7)
+        if not known:
+            ax.text(0.5, 0.5, labels["no_data"], ha="center", va="center", transform=ax.transAxes)
+            continue
+        for model, point in known.items():
+            ax.scatter(point[field], point["accuracy"])
+            ax.annotate(clean_name(model), (point[field], point["accuracy"]), textcoords="offset points", xytext=(4, 4), fontsize=8)
+    fig.suptitle(labels["scatter_title"])
+    fig.tight_layout()
+    return save_figure(plt, fig, output_filename, dpi)
+
+def plot_trends(history, output_filename, labels=None, dpi=PLOT_DPI):
+    """Overall accuracy of every model across the runs recorded in the report history."""
+    labels = labels or LABELS[LANGUAGE]
+    plt = load_pyplot()
+    lines = {}
+    for entry in history:
+        when = datetime.fromisoformat(entry["time"])
+        for model, accuracy in entry["models"].items():
+            lines.setdefault(model, []).append((when, accuracy))
+    fig, ax = plt.subplots(figsize=(12, 6))
+    for model, line in lines.items():
+        dates, values = zip(*line)
+        ax.plot(dates, values, marker="o", label=clean_name(model))
+    ax.set_title(labels["trends_title"])
+    ax.set_xlabel(labels["date"])
+    ax.set_ylabel(labels["accuracy"])
+    ax.set_ylim(0, 105)
+    ax.grid(linestyle='--', alpha=0.7)
+    if lines:
+        ax.legend(title=labels["models"], bbox_to_anchor=(1.05, 1), loc='upper left')
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    return save_figure(plt, fig, output_filename, dpi)
 
 
-# --- Main Execution ---
-if __name__ == "__main__":
-    all_model_results = {}
-    print(f"Scanning for JSON files in: {os.path.abspath(JSON_FOLDER_PATH)}")
-
-    if not os.path.isdir(JSON_FOLDER_PATH):
-        print(f"Error: Folder not found - {JSON_FOLDER_PATH}")
-    else:
-        found_files = False
-        for filename in os.listdir(JSON_FOLDER_PATH):
-            if filename.lower().endswith('.json'):
-                found_files = True
-                filepath = os.path.join(JSON_FOLDER_PATH, filename)
-                print(f"Processing: {filename}...")
-                model_name, section_scores = calculate_scores(filepath)
-
-                if model_name is not None and section_scores is not None:
-                    # Handle potential duplicate model names if needed (e.g., append count)
-                    if model_name in all_model_results:
-                         print(f"Warning: Duplicate model name '{model_name}' found in {filename}. Overwriting previous results for this model.")
-                    if section_scores: # Only add if there are actual scores
-                        all_model_results[model_name] = section_scores
-                    else:
-                        print(f"Skipping model '{model_name}' from {filename} due to no valid section data.")
-
-        if not found_files:
-             print("No JSON files found in the specified folder.")
-        elif not all_model_results:
-            print("No valid model results were extracted from the JSON files.")
+def print_score_table(models, section_names, accuracy, lower, upper):
+    """Prints per-section accuracy with its confidence interval for every model."""
+    print(f"\nSection accuracy with {CONFIDENCE_LEVEL:.0%} bootstrap confidence intervals:")
+    for i, model in enumerate(models):
+        cells = [f"{name}: {accuracy[i, j]:.1f}% [{lower[i, j]:.1f}, {upper[i, j]:.1f}]"
+                 for j, name in enumerate(section_names)]
+        print(f"  {clean_name(model)}: " + "; ".join(cells))
+
+def pass_at_k(n, c, k):
+    """Unbiased pass@k per question: the chance that k of the n samples, c of them correct, include a correct one.
+
+    n and c are arrays over questions; every n must be at least k.
+    """
+    n, c = np.asarray(n, dtype=np.float64), np.asarray(c, dtype=np.float64)
+    # 1 - C(n-c, k) / C(n, k), written as a product so large n doesn't overflow
+    i = np.arange(k)[None, :]
+    fail = np.prod(np.clip((n[:, None] - c[:, None] - i) / (n[:, None] - i), 0.0, 1.0), axis=1)
+    return 1.0 - fail
+
+def sampling_stats(sample_rows):
+    """Per-model repeated-sampling scores from ResultsIndex.sample_rows().
+
+    Returns {model: {"questions", "samples", "undecided", "pass@k": {k: %}, "majority", "agreement"}},
+    where majority is the accuracy of the majority verdict over each question's samples (ties count
+    as wrong) and agreement the mean share of samples that agree with that majority. A question with
+    any ungraded sample is left out, so every score uses all of its samples; "undecided" counts them.
+    """
+    per_question = {}
+    for _path, model, question_id, _sample, correct in sample_rows:
+        counts = per_question.setdefault(model, {}).setdefault(question_id, [0, 0, 0])
+        counts[0] += 1
+        if correct is None:
+            counts[2] += 1
         else:
+            counts[1] += correct
+    stats = {}
+    for model, all_questions in per_question.items():
+        questions = {question_id: counts[:2] for question_id, counts in all_questions.items() if not counts[2]}
+        undecided = len(all_questions) - len(questions)
+        if not questions:
+            print(f"Note: No question of {clean_name(model)} has all of its samples graded; leaving it out of the sampling scores.")
+            continue
+        n, c = np.array(list(questions.values())).T
+        k_max = int(n.min())
+        stats[model] = {
+            "questions": len(questions),
+            "samples": k_max,
+            "undecided": undecided,
+            "pass@k": {k: 100.0 * pass_at_k(n, c, k).mean() for k in sorted({1, k_max})},
+            "majority": 100.0 * np.mean(2 * c > n),
+            "agreement": 100.0 * np.mean(np.maximum(c, n - c) / n),
+            "agreement_by_question": dict(zip(questions, np.maximum(c, n - c) / n)),
+        }
+    return stats
+
+def print_sampling_table(stats, lowest=5):
+    """Prints pass@1, pass@k, majority-vote accuracy and agreement, plus the least consistent questions."""
+    print("\nRepeated sampling (raiq.py --samples):")
+    for model, row in sorted(stats.items(), key=lambda item: -item[1]["majority"]):
+        passes = ", ".join(f"pass@{k}: {value:.1f}%" for k, value in row["pass@k"].items())
+        print(f"  {clean_name(model)}: {row['samples']} samples x {row['questions']} questions; {passes}; "
+              f"majority vote: {row['majority']:.1f}%; agreement: {row['agreement']:.1f}%"
+              + (f" ({row['undecided']} question(s) with ungraded samples left out)" if row["undecided"] else ""))
+    disagreements = {}
+    for row in stats.values():
+        for question_id, agreement in row["agreement_by_question"].items():
+            disagreements.setdefault(question_id, []).append(agreement)
+    worst = sorted(disagreements.items(), key=lambda item: np.mean(item[1]))[:lowest]
+    if worst and np.mean(worst[0][1]) < 1.0:
+        print("  Least consistent questions (mean agreement across models):")
+        for question_id, values in worst:
+            print(f"    {question_id}: {100.0 * np.mean(values):.1f}%")
+
+def significant_pairs(models, correct, answered):
+    """(p-value, i, j) of every model pair whose overall results differ significantly (exact McNemar test), plus overall accuracy."""
+    pvalues = mcnemar_pvalues(correct, answered)
+    overall = section_accuracy(correct, answered, np.ones((correct.shape[1], 1), dtype=bool))[:, 0]
+    pairs = [(pvalues[i, j], i, j) for i in range(len(models)) for j in range(i + 1, len(models))
+             if pvalues[i, j] < SIGNIFICANCE_LEVEL]
+    return sorted(pairs), overall
+
+def print_significant_pairs(models, correct, answered):
+    """Prints model pairs whose overall results differ significantly (exact McNemar test)."""
+    pairs, overall = significant_pairs(models, correct, answered)
+    print(f"\nSignificantly different model pairs (McNemar, p < {SIGNIFICANCE_LEVEL}): {len(pairs)} of {len(models) * (len(models) - 1) // 2}")
+    for pvalue, i, j in pairs:
+        print(f"  {clean_name(models[i])} ({overall[i]:.1f}%) vs {clean_name(models[j])} ({overall[j]:.1f}%): p = {pvalue:.4f}")
+
+def model_costs(rows, models):
+    """{model: (median latency, mean cost per question)} from the metrics raiq.py recorded; None where none were."""
+    latencies, costs = {}, {}
+    for _path, model, _section, _section_pos, _question_pos, _question_id, _correct, latency, cost in rows:
+        if latency is not None:
+            latencies.setdefault(model, []).append(latency)
+        if cost is not None:
+            costs.setdefault(model, []).append(cost)
+    return {model: (float(np.median(latencies[model])) if model in latencies else None,
+                    float(np.mean(costs[model])) if model in costs else None) for model in models}
+
+def inputs_digest(index, folder, settings):
+    """Content hash of the results files and every setting that changes what is drawn."""
+    digest = hashlib.sha256(index.digest(folder).encode("utf-8"))
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+def read_history(path):
+    """Entries of the report history (JSON Lines), oldest first."""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def append_history(path, entry):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+def render_views(jobs, workers):
+    """Draw each (function, args) job, in a process pool when there is more than one worker.
+
+    Returns True if every chart was saved.
+    """
+    if workers <= 1 or len(jobs) <= 1:
+        return all([function(*job_args) for function, job_args in jobs])
+    saved = True
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        futures = [pool.submit(function, *job_args) for function, job_args in jobs]
+        for (function, _job_args), future in zip(jobs, futures):
+            try:
+                saved = bool(future.result()) and saved
+            except Exception as e:
+                print(f"Error: {function.__name__} failed: {e}")
+                saved = False
+    return saved
+
+def write_report(report_dir, images, models, section_names, accuracy, lower, upper, pairs, overall, sampling, labels):
+    """Write report.md and report.html next to the rendered charts."""
+    generated = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    ranking = np.argsort(-overall, kind="stable")
+    header = [labels["model"]] + section_names + [labels["overall"]]
+    table = [[clean_name(models[i])]
+             + [f"{accuracy[i, j]:.1f}% [{lower[i, j]:.1f}, {upper[i, j]:.1f}]" for j in range(len(section_names))]
+             + [f"{overall[i]:.1f}%"] for i in ranking]
+    significant = labels["significant"].format(level=SIGNIFICANCE_LEVEL)
+    pair_lines = [f"{clean_name(models[i])} ({overall[i]:.1f}%) vs {clean_name(models[j])} ({overall[j]:.1f}%): p = {pvalue:.4f}"
+                  for pvalue, i, j in pairs]
+    sampling_header, sampling_table = None, []
+    if sampling:
+        ks = sorted({k for row in sampling.values() for k in row["pass@k"]})
+        sampling_header = ([labels["model"]] + [f"pass@{k}" for k in ks]
+                           + [labels["majority"], labels["agreement"], labels["questions"], labels["undecided"]])
+        for model, row in sorted(sampling.items(), key=lambda item: -item[1]["majority"]):
+            sampling_table.append([clean_name(model)] + [f"{row['pass@k'][k]:.1f}%" if k in row["pass@k"] else "-" for k in ks]
+                                  + [f"{row['majority']:.1f}%", f"{row['agreement']:.1f}%", str(row["questions"]), str(row["undecided"])])
+
+    markdown = [f"# {labels['report_title']}", "", f"{labels['generated']}: {generated}", ""]
+    markdown += ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    markdown += ["| " + " | ".join(row) + " |" for row in table]
+    markdown += ["", f"## {significant}", ""] + ([f"- {line}" for line in pair_lines] or [labels["none"]])
+    if sampling_header:
+        markdown += ["", f"## {labels['sampling']}", "", "| " + " | ".join(sampling_header) + " |", "|" + "---|" * len(sampling_header)]
+        markdown += ["| " + " | ".join(row) + " |" for row in sampling_table]
+    markdown += [""] + [f"![{title}]({filename})" for title, filename in images]
+    with open(os.path.join(report_dir, "report.md"), 'w', encoding='utf-8') as f:
+        f.write("\n".join(markdown) + "\n")
+
+    def html_table(head, body):
+        cells = "".join(f"<th>{html.escape(cell)}</th>" for cell in head)
+        rows = "".join("<tr>" + "".join(f"<td>{html.escape(cell)}</td>" for cell in row) + "</tr>" for row in body)
+        return f"<table><thead><tr>{cells}</tr></thead><tbody>{rows}</tbody></table>"
+
+    parts = [f"<h1>{html.escape(labels['report_title'])}</h1>",
+             f"<p>{html.escape(labels['generated'])}: {html.escape(generated)}</p>",
+             html_table(header, table),
+             f"<h2>{html.escape(significant)}</h2>",
+             "<ul>" + "".join(f"<li>{html.escape(line)}</li>" for line in pair_lines) + "</ul>" if pair_lines
+             else f"<p>{html.escape(labels['none'])}</p>"]
+    if sampling_header:
+        parts += [f"<h2>{html.escape(labels['sampling'])}</h2>", html_table(sampling_header, sampling_table)]
+    parts += [f'<figure><img src="{html.escape(filename)}" alt="{html.escape(title)}"></figure>' for title, filename in images]
+    page = ('<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+            f"<title>{html.escape(labels['report_title'])}</title>"
+            "<style>body{font-family:sans-serif;margin:2em}table{border-collapse:collapse}"
+            "th,td{border:1px solid #ccc;padding:4px 8px;text-align:right}th:first-child,td:first-child{text-align:left}"
+            "img{max-width:100%}</style></head><body>\n" + "\n".join(parts) + "\n</body></html>\n")
+    with open(os.path.join(report_dir, "report.html"), 'w', encoding='utf-8') as f:
+        f.write(page)
+
+
+def up_to_date(index, output, digest, paths):
+    return index.rendered(output) == digest and all(os.path.exists(path) for path in paths)
+
+def main():
+    parser = argparse.ArgumentParser(description="Score graded replies and draw the comparison charts.")
+    parser.add_argument("--folder", default=JSON_FOLDER_PATH, help=f"Graded replies folder (default: {JSON_FOLDER_PATH})")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--no-plot", action="store_true", help="Only print the scores; matplotlib is never imported")
+    mode.add_argument("--report", nargs="?", const=REPORT_DIR, metavar="DIR",
+                      help=f"Draw every chart and write report.html and report.md into DIR (default: {REPORT_DIR})")
+    parser.add_argument("--output", default=OUTPUT_FILENAME, help=f"Section chart without --report (default: {OUTPUT_FILENAME})")
+    parser.add_argument("--format", choices=("png", "svg", "pdf"), default=PLOT_FORMAT, help=f"Chart format for --report (default: {PLOT_FORMAT})")
+    parser.add_argument("--dpi", type=int, default=PLOT_DPI, help=f"Resolution of PNG charts (default: {PLOT_DPI})")
+    parser.add_argument("--lang", choices=sorted(LABELS), default=LANGUAGE, help=f"Language of chart and report labels (default: {LANGUAGE})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes drawing charts in parallel (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Redraw even if no results file changed")
+    args = parser.parse_args()
+    if args.dpi < 1 or args.workers < 1:
+        parser.error("--dpi and --workers must be at least 1")
+    folder = args.folder
+
+    print(f"Scanning for JSON files in: {os.path.abspath(folder)}")
+
+    if not os.path.isdir(folder):
+        print(f"Error: Folder not found - {folder}")
+        sys.exit(1)
+    index = ResultsIndex(INDEX_PATH)
+    try:
+        updated, unchanged, removed = index.refresh(folder)
+        print(f"Results index: {updated} file(s) re-indexed, {unchanged} unchanged, {removed} removed.")
+        indexed_files = index.files(folder)
+        model_files = {}
+        for filepath, model_name in indexed_files:
+            filename = os.path.basename(filepath)
+            print(f"Processing: {filename}...")
+            # Handle potential duplicate model names if needed (e.g., append count)
+            if model_name in model_files:
+                 print(f"Warning: Duplicate model name '{model_name}' found in {filename}. Overwriting previous results for this model.")
+            model_files[model_name] = filepath
+        selected_files = set(model_files.values())
+        rows = [row for row in index.rows(folder) if row[0] in selected_files]
+        sample_rows = [row for row in index.sample_rows(folder) if row[0] in selected_files]
+
+        for model_name, filepath in model_files.items():
+            if not any(row[0] == filepath for row in rows):
+                print(f"Skipping model '{model_name}' from {os.path.basename(filepath)} due to no valid section data.")
+
+        if not indexed_files:
+            print("No JSON files found in the specified folder.")
+            return
+        if not rows:
+            print("No valid model results were extracted from the JSON files.")
+            return
+
+        models, question_sections, correct, answered = build_score_matrix(rows)
+        section_names = list(dict.fromkeys(question_sections))
+        onehot = section_onehot(question_sections, section_names)
+        accuracy = section_accuracy(correct, answered, onehot)
+        lower, upper = bootstrap_section_ci(correct, answered, onehot, BOOTSTRAP_RESAMPLES, CONFIDENCE_LEVEL)
+        print_score_table(models, section_names, accuracy, lower, upper)
+        print_significant_pairs(models, correct, answered)
+        sampling = sampling_stats(sample_rows) if sample_rows else None
+        if sampling:
+            print_sampling_table(sampling)
+        if args.no_plot:
+            return
+
+        labels = LABELS[args.lang]
+        all_model_results = {model: dict(zip(section_names, accuracy[i])) for i, model in enumerate(models)}
+        error_bars = {model: {name: (lower[i, j], upper[i, j]) for j, name in enumerate(section_names)}
+                      for i, model in enumerate(models)}
+        settings = {"lang": args.lang, "dpi": args.dpi, "section_order": SECTION_ORDER,
+                    "bootstrap": [BOOTSTRAP_RESAMPLES, CONFIDENCE_LEVEL], "significance": SIGNIFICANCE_LEVEL}
+
+        if args.report is None:
+            digest = inputs_digest(index, folder, settings)
+            output = os.path.abspath(args.output)
+            if not args.force and up_to_date(index, output, digest, [output]):
+                print(f"\n{args.output} is up to date; no results changed since it was drawn (--force redraws it).")
+                return
             # Generate the plot
-            plot_results(all_model_results, SECTION_ORDER, OUTPUT_FILENAME)
\ No newline at end of file
+            if plot_results(all_model_results, SECTION_ORDER, args.output, error_bars, labels, args.dpi):
+                index.set_rendered(output, digest)
+            return
+
+        report_dir = args.report
+        os.makedirs(report_dir, exist_ok=True)
+        settings["format"] = args.format
+        digest = inputs_digest(index, folder, settings)
+        charts = {name: os.path.join(report_dir, f"{name}.{args.format}") for name in ("sections", "heatmap", "scatter", "trends")}
+        outputs = list(charts.values()) + [os.path.join(report_dir, "report.html"), os.path.join(report_dir, "report.md")]
+        output = os.path.abspath(report_dir)
+        if not args.force and up_to_date(index, output, digest, outputs):
+            print(f"\nReport in {report_dir} is up to date; no results changed since it was written (--force redraws it).")
+            return
+
+        pairs, overall = significant_pairs(models, correct, answered)
+        history_path = os.path.join(report_dir, "history.jsonl")
+        history = read_history(history_path)
+        results_digest = index.digest(folder)
+        if not history or history[-1]["digest"] != results_digest:
+            entry = {"time": datetime.now(timezone.utc).isoformat(timespec="seconds"), "digest": results_digest,
+                     "models": {model: round(float(overall[i]), 2) for i, model in enumerate(models)}}
+            append_history(history_path, entry)
+            history.append(entry)
+        costs = model_costs(rows, models)
+        points = {model: {"accuracy": float(overall[i]), "latency": costs[model][0], "cost": costs[model][1]}
+                  for i, model in enumerate(models)}
+        jobs = [
+            (plot_results, (all_model_results, SECTION_ORDER, charts["sections"], error_bars, labels, args.dpi)),
+            (plot_heatmap, (models, question_sections, correct, answered, charts["heatmap"], labels, args.dpi)),
+            (plot_scatter, (points, charts["scatter"], labels, args.dpi)),
+            (plot_trends, (history, charts["trends"], labels, args.dpi)),
+        ]
+        print(f"\nDrawing {len(jobs)} charts into {report_dir}...")
+        saved = render_views(jobs, args.workers)
+        images = [(labels[title], os.path.basename(charts[name])) for name, title in
+                  (("sections", "sections_title"), ("heatmap", "heatmap_title"), ("scatter", "scatter_title"), ("trends", "trends_title"))]
+        write_report(report_dir, images, models, section_names, accuracy, lower, upper, pairs, overall, sampling, labels)
+        if saved:
+            index.set_rendered(output, digest)
+        print(f"Report written to {os.path.join(report_dir, 'report.html')} and report.md")
+    finally:
+        index.close()
+
+# --- Main Execution ---
+if __name__ == "__main__":
+    main()
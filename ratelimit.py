@@ -0,0 +1,146 @@
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+
+class RequestFailed(Exception):
+    """Raised when a request to the API did not produce a usable reply."""
+    def __init__(self, message, status=None, retryable=False, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+def is_retryable_status(status):
+    """429 (throttled), 408 (timeout) and any 5xx are worth another attempt."""
+    return status in (408, 429) or (status is not None and 500 <= status < 600)
+
+def parse_retry_after(headers):
+    """Return the number of seconds the server asked us to wait, or None.
+
+    Understands `Retry-After` (seconds or an HTTP date) and the
+    `X-RateLimit-Remaining` / `X-RateLimit-Reset` pair, where the reset may be
+    a delay in seconds or an epoch timestamp in seconds or milliseconds.
+    """
+    if not headers:
+        return None
+    retry_after = headers.get("Retry-After")
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    remaining = headers.get("X-RateLimit-Remaining")
+    reset = headers.get("X-RateLimit-Reset")
+    if remaining is not None and reset is not None:
+        try:
+            if float(remaining) > 0:
+                return None
+            reset = float(reset)
+        except ValueError:
+            return None
+        if reset > 1e12:  # Epoch milliseconds (what OpenRouter sends)
+            return max(0.0, reset / 1000 - time.time())
+        if reset > 1e9:  # Epoch seconds
+            return max(0.0, reset - time.time())
+        return max(0.0, reset)
+    return None
+
+def backoff_delay(attempt, base=1.0, cap=60.0):
+    """Exponential backoff with full jitter for the given 0-based attempt."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class TokenBucket:
+    """Async token bucket handing out `rate` requests per second with bursts up to `capacity`."""
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def block_for(self, seconds):
+        """Hand out no tokens for the next `seconds` seconds."""
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+    async def acquire(self):
+        """Wait until a token is available and take it. Returns the seconds spent waiting."""
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                else:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return waited
+                    delay = (1 - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+class AdaptiveRateLimiter(TokenBucket):
+    """Token bucket whose rate is tuned with AIMD.
+
+    Every successful request raises the rate by `increase` requests/second;
+    every throttled one multiplies it by `decrease`. The rate settles just
+    under whatever the provider is willing to serve for this model.
+    """
+    def __init__(self, rate, min_rate=0.1, max_rate=20.0, increase=0.1, decrease=0.5):
+        super().__init__(rate, capacity=max(1.0, rate))
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+
+    def _set_rate(self, rate):
+        self._refill(time.monotonic())
+        self.rate = min(self.max_rate, max(self.min_rate, rate))
+        self.capacity = max(1.0, self.rate)
+
+    def on_success(self, headers=None):
+        """Additive increase, unless the headers say the quota is used up."""
+        wait = parse_retry_after(headers)
+        if wait:
+            self.block_for(wait)
+        else:
+            self._set_rate(self.rate + self.increase)
+
+    def on_throttle(self, retry_after=None):
+        """Multiplicative decrease, and pause for as long as the server asked."""
+        self._set_rate(self.rate * self.decrease)
+        if retry_after:
+            self.block_for(retry_after)
+
+class RetryStats:
+    """Per-model counters for the run summary."""
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.throttle_seconds = 0.0
+        self.failed = 0
+        self.statuses = {}  # HTTP status (or "error" when none was received) -> responses
+
+    def count_status(self, status):
+        key = str(status) if status is not None else "error"
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def summary(self, limiter=None):
+        line = (f"requests: {self.requests}, retries: {self.retries}, throttled: {self.throttled}, "
+                f"throttle time: {self.throttle_seconds:.1f}s, failed: {self.failed}")
+        if limiter is not None:
+            line += f", final rate: {limiter.rate:.2f} req/s"
+        return line
@@ -1,55 +1,94 @@
-import json
+import time
 import argparse
 import os
 import sys
+from journal import Journal, read_journal
+from questions import question_id
+from reply_io import append_updates, is_jsonl, load_results, save_results
+
+# Fields an editing session can change; only these are appended when saving a .jsonl file
+GRADING_FIELDS = ('correct', 'graded_by', 'grade_confidence')
 
 def load_json(filepath):
-    """Loads JSON data from a file."""
+    """Loads replies data from a .json or .jsonl file."""
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        return load_results(filepath)
     except FileNotFoundError:
         print(f"Error: File not found at '{filepath}'")
         return None
-    except json.JSONDecodeError:
+    except ValueError:
         print(f"Error: Could not decode JSON from '{filepath}'. Check file format.")
         return None
     except Exception as e:
         print(f"An unexpected error occurred while loading the file: {e}")
         return None
 
-def save_json(filepath, data):
-    """Saves Python data to a JSON file."""
+def question_key(question):
+    """The stable id of a question; legacy files without ids get it from the question text."""
+    return question.get('id') or question_id(question.get('question', ''))
+
+def grading_state(data):
+    """Maps each question id to its grading fields, so a save can tell which questions were edited."""
+    return {
+        question_key(question): {field: question.get(field) for field in GRADING_FIELDS}
+        for section in data.get("sections", [])
+        for question in section.get("questions", [])
+    }
+
+def journal_path_for(filepath):
+    """The grading journal that holds unsaved verdicts for a file."""
+    return filepath + ".grading.journal.jsonl"
+
+def replay_journal(filepath, data):
+    """Re-applies verdicts a previous session journaled but never saved. Returns how many were applied."""
+    questions = {
+        question_key(question): question
+        for section in data.get("sections", [])
+        for question in section.get("questions", [])
+    }
+    replayed = 0
+    for record in read_journal(journal_path_for(filepath)):
+        if record.get("file", os.path.basename(filepath)) != os.path.basename(filepath):
+            print(f"Warning: Journaled verdict for another file '{record['file']}' skipped.")
+            continue
+        question = questions.get(record.get("id"))
+        if question is None:
+            print(f"Warning: Journaled verdict for unknown question '{record.get('id')}' skipped.")
+            continue
+        question['correct'] = record["correct"]
+        mark_human_graded(question)
+        replayed += 1
+    return replayed
+
+def save_jsonl_edits(filepath, data, loaded_state):
+    """Appends the grading fields that changed since loading to a .jsonl file."""
+    updates = {
+        qid: fields
+        for qid, fields in grading_state(data).items()
+        if fields != loaded_state.get(qid)
+    }
+    try:
+        append_updates(filepath, updates)
+    except OSError as e:
+        print(f"Error: Could not write to file '{filepath}'. {e}")
+        return False
+    print(f"Successfully saved {len(updates)} change(s) to '{filepath}'")
+    return True
+
+def save_json(filepath, data, loaded_state=None):
+    """Saves Python data to a JSON file, or appends the edits to a .jsonl file.
+
+    JSON files are written to a temporary file, fsync'd and moved into place
+    with os.replace, so the original is intact until the new version is complete.
+    """
+    if is_jsonl(filepath) and loaded_state is not None:
+        return save_jsonl_edits(filepath, data, loaded_state)
     try:
-        # Create a backup before overwriting
-        backup_path = filepath + ".bak"
-        if os.path.exists(filepath):
-             try:
-                 # Attempt to remove old backup first if it exists
-                 if os.path.exists(backup_path):
-                     os.remove(backup_path)
-                 os.rename(filepath, backup_path)
-                 print(f"Backup of previous version created at '{backup_path}'")
-             except OSError as backup_e:
-                 print(f"Warning: Could not create backup: {backup_e}")
-
-
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4) # Use indent for pretty printing
+        save_results(filepath, data)
         print(f"Successfully saved changes to '{filepath}'")
-        # Optionally remove backup after successful save
-        # if os.path.exists(backup_path):
-        #    os.remove(backup_path)
         return True
-    except IOError as e:
+    except OSError as e:
         print(f"Error: Could not write to file '{filepath}'. {e}")
-        # Attempt to restore backup if save failed and backup exists
-        if os.path.exists(backup_path) and not os.path.exists(filepath):
-             try:
-                 os.rename(backup_path, filepath)
-                 print("Restored from backup due to save error.")
-             except Exception as restore_e:
-                 print(f"Error: Could not restore backup after failed save: {restore_e}")
         return False
     except Exception as e:
         print(f"An unexpected error occurred while saving the file: {e}")
@@ -109,8 +148,33 @@ def display_section_menu(section_data, section_index):
     print("  b: Back to main menu")
     print("--------------------------------------")
 
-def edit_question_correct_status(question, question_num, total_questions):
-    """Allows editing the 'correct' status of a single question. Returns False if user cancels."""
+def mark_human_graded(question):
+    """Records that a person, not autograde.py, decided this question."""
+    question['graded_by'] = 'human'
+    question.pop('grade_confidence', None)
+
+def find_suggestion(grade_index, question):
+    """Looks up the verdict given to an equivalent reply in another file, or None."""
+    if grade_index is None or question.get('correct') is not None:
+        return None
+    return grade_index.lookup(question.get('question', ''), question.get('reply'))
+
+def set_verdict(question, verdict, journal=None, filepath=None):
+    """Sets a human verdict and journals it right away, so it survives a crash before saving."""
+    question['correct'] = verdict
+    mark_human_graded(question)
+    if journal is not None:
+        journal.append({"file": os.path.basename(filepath or ""), "id": question_key(question),
+                        "correct": verdict, "time": time.time()})
+    print(f"Status set to {verdict}.")
+
+def edit_question_correct_status(question, question_num, total_questions, suggestion=None, journal=None, filepath=None):
+    """Allows editing the 'correct' status of a single question. Returns False if user cancels.
+
+    `suggestion` is a (verdict, similarity, sources) match from grade_index.py, which
+    the user can accept with 'a'. Verdicts are appended to `journal` (as verdicts for
+    `filepath`) as they are given.
+    """
     print(f"\n--- Edit Question ({question_num}/{total_questions}) ---")
     print(f"  Question:        {question.get('question', 'N/A')}")
     print(f"  Expected Answer: {question.get('expected_answer', 'N/A')}")
@@ -118,17 +182,24 @@ def edit_question_correct_status(question, question_num, total_questions):
     current_status = question.get('correct')
     status_str = 'None' if current_status is None else str(current_status)
     print(f"  Current Status:  {status_str}")
+    if question.get('graded_by'):
+        print(f"  Graded By:       {question['graded_by']}")
+    if suggestion is not None:
+        verdict, score, sources = suggestion
+        print(f"  Suggestion:      {verdict} (equivalent reply in {', '.join(sorted(set(sources)))}, similarity {score:.2f})")
     print("---------------------------" + "-"*len(str(question_num) + str(total_questions))) # Dynamic separator
 
+    options = "y/n/a/c - yes/no/accept suggestion/cancel sequence" if suggestion is not None else "y/n/c - yes/no/cancel sequence"
     while True:
-        choice = input("Is the reply correct? (y/n/c - yes/no/cancel sequence): ").lower().strip()
-        if choice == 'y':
-            question['correct'] = True
-            print("Status set to True.")
+        choice = input(f"Is the reply correct? ({options}): ").lower().strip()
+        if choice == 'a' and suggestion is not None:
+            set_verdict(question, suggestion[0], journal, filepath)
+            return True # Continue sequence
+        elif choice == 'y':
+            set_verdict(question, True, journal, filepath)
             return True # Continue sequence
         elif choice == 'n':
-            question['correct'] = False
-            print("Status set to False.")
+            set_verdict(question, False, journal, filepath)
             return True # Continue sequence
         elif choice == 'c':
             print("Edit sequence cancelled.")
@@ -140,12 +211,27 @@ def edit_question_correct_status(question, question_num, total_questions):
 def main():
     """Main function to run the CLI."""
     parser = argparse.ArgumentParser(description="CLI tool to edit 'correct' status in specific JSON files.")
-    parser.add_argument("filepath", help="Path to the JSON file to edit.")
+    parser.add_argument("filepath", help="Path to the .json or .jsonl file to edit.")
+    parser.add_argument("--no-suggest", action="store_true", help="Don't suggest verdicts from equivalent replies in replies/ and rated-replies/.")
     args = parser.parse_args()
 
     data = load_json(args.filepath)
     if data is None:
         sys.exit(1) # Exit if file loading failed
+    loaded_state = grading_state(data)
+
+    journal_path = journal_path_for(args.filepath)
+    replayed = replay_journal(args.filepath, data)
+    if replayed:
+        print(f"Recovered {replayed} unsaved verdict(s) from '{journal_path}'. Press 's' to save them.")
+    # Every verdict is journaled (and fsync'd) the moment it is given
+    journal = Journal(journal_path, fsync_every=1)
+
+    grade_index = None
+    if not args.no_suggest:
+        from grade_index import build_index # Imported here so --no-suggest doesn't need numpy
+        grade_index = build_index(exclude=[args.filepath])
+        print(f"Indexed {len(grade_index.entries)} graded replies for suggestions.")
 
     print(f"Loaded '{args.filepath}'. Starting editor...") # Generic welcome
 
@@ -154,11 +240,24 @@ def main():
         choice = input("Enter choice: ").lower().strip()
 
         if choice == 'q':
-            # Optional: Add a confirmation step if changes were made
+            journal.close()
+            # The journal holds every verdict not yet saved, recovered ones included
+            if os.path.getsize(journal_path) > 0:
+                answer = input("There are unsaved verdicts. Discard them (d), keep them for the next session (k), "
+                               "or go back (any other key)? ").lower().strip()
+                if answer == 'k':
+                    print(f"Exiting without saving. The verdicts stay in '{journal_path}' and are recovered next time.")
+                    break
+                if answer != 'd':
+                    journal = Journal(journal_path, fsync_every=1)
+                    continue
             print("Exiting without saving.")
+            os.remove(journal_path)
             break
         elif choice == 's':
-            if save_json(args.filepath, data):
+            if save_json(args.filepath, data, loaded_state):
+                journal.close()
+                os.remove(journal_path) # Compacted into the file, so the journal is no longer needed
                 print("Changes saved. Exiting.")
             else:
                 print("Save failed. Please check errors above. Not exiting.")
@@ -191,7 +290,8 @@ def main():
                                     for current_q_idx in range(start_question_idx, total_q):
                                         question_to_edit = questions[current_q_idx]
                                         # Pass current and total question numbers for context
-                                        proceed = edit_question_correct_status(question_to_edit, current_q_idx + 1, total_q)
+                                        suggestion = find_suggestion(grade_index, question_to_edit)
+                                        proceed = edit_question_correct_status(question_to_edit, current_q_idx + 1, total_q, suggestion, journal, args.filepath)
                                         if not proceed: # User entered 'c' to cancel
                                             break # Exit the inner for loop
                                     # --- Sequential Editing Ends Here ---
@@ -0,0 +1,250 @@
+import os
+import sys
+import asyncio
+import argparse
+from dotenv import load_dotenv
+from journal import Journal
+from questions import QuestionFileError, load_questions, question_id, to_sections
+from reply_io import iter_questions, list_results_files, load_results, read_model, save_results
+from raiq import (add_request_arguments, check_distinct_paths, check_request_arguments, journal_path_for,
+                  output_path_for_model, read_models_file, run_sweep)
+
+# --- Configuration ---
+DEFAULT_QUESTIONS = "questions.txt"
+DEFAULT_MODELS_FILE = "OR_models.txt"
+DEFAULT_REPLIES_DIR = "replies"
+DEFAULT_RATED_DIR = "rated-replies"
+# Fields of a graded question that are carried forward when its grade is still valid
+GRADE_FIELDS = ("correct", "graded_by", "grade_confidence", "reviewer")
+# --- End Configuration ---
+
+def same_text(a, b):
+    return " ".join((a or "").split()) == " ".join((b or "").split())
+
+def has_reply(question):
+    return question is not None and bool(question.get("reply")) and not question.get("skipped")
+
+def index_folder(folder):
+    """{model: filepath} for the replies files in a folder; a later file wins for a duplicate model."""
+    files = {}
+    for filepath in list_results_files(folder):
+        try:
+            model = read_model(filepath)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read '{filepath}': {e}")
+            continue
+        if model in files:
+            print(f"Warning: Duplicate model name '{model}' in {filepath}; using it instead of {files[model]}.")
+        files[model] = filepath
+    return files
+
+def load_cells(filepath):
+    """{question id: question dict} of one replies file, or {} if there is none."""
+    if filepath is None or not os.path.exists(filepath):
+        return {}
+    return {question.get("id") or question_id(question.get("question", "")): question
+            for _section, question in iter_questions(filepath)}
+
+def plan_model(bank, replies, rated):
+    """Decide what to do with every (model, question) cell.
+
+    A cell is reused when its graded reply in rated-replies/ is still the
+    current reply and the expected answer hasn't changed; it needs grading
+    when a reply exists but no valid grade; otherwise it is fetched. Question
+    IDs are hashes of the question text, so an edited question is a new cell.
+    Returns ({"fetch", "grade", "reuse", "drop": [question id, ...]}, {question id: question dict}).
+    """
+    plan = {"fetch": [], "grade": [], "reuse": [], "drop": []}
+    cells = {}
+    for record in bank:
+        old_reply, old_rated = replies.get(record.id), rated.get(record.id)
+        source = old_reply if has_reply(old_reply) else old_rated if has_reply(old_rated) else None
+        if source is None:
+            plan["fetch"].append(record.id)
+            continue
+        cell = {"id": record.id, "question": record.question, "expected_answer": record.expected_answer,
+                "reply": source["reply"], "correct": None}
+        for field in ("metrics", "samples"):
+            if source.get(field):
+                cell[field] = source[field]
+        if (has_reply(old_rated) and old_rated.get("correct") is not None and old_rated["reply"] == source["reply"]
+                and same_text(old_rated.get("expected_answer"), record.expected_answer)):
+            for field in GRADE_FIELDS:
+                if field in old_rated:
+                    cell[field] = old_rated[field]
+            if old_rated.get("samples"):
+                cell["samples"] = old_rated["samples"]
+            plan["reuse"].append(record.id)
+        else:
+            plan["grade"].append(record.id)
+        cells[record.id] = cell
+    current = {record.id for record in bank}
+    plan["drop"] = sorted((set(replies) | set(rated)) - current)
+    return plan, cells
+
+def print_plan(plans, untouched):
+    print(f"\n{'Model':<45} {'fetch':>7} {'grade':>7} {'reuse':>7} {'drop':>7}")
+    totals = {kind: 0 for kind in ("fetch", "grade", "reuse", "drop")}
+    for model, plan in plans.items():
+        print(f"{model:<45} " + " ".join(f"{len(plan[kind]):>7}" for kind in totals))
+        for kind in totals:
+            totals[kind] += len(plan[kind])
+    print(f"{'Total':<45} " + " ".join(f"{totals[kind]:>7}" for kind in totals))
+    for model in untouched:
+        print(f"Not in the model list, left as is: {model}")
+    print(f"\nRequests to send: {totals['fetch']}; replies to grade: {totals['fetch'] + totals['grade']}; grades carried forward: {totals['reuse']}")
+    return totals
+
+def ungraded_copy(cell):
+    question = {field: value for field, value in cell.items() if field not in GRADE_FIELDS}
+    question["correct"] = None
+    if cell.get("samples"):
+        question["samples"] = [{"reply": sample["reply"], "correct": None} for sample in cell["samples"]]
+    return question
+
+def build_document(model, bank, cells):
+    """An ungraded results document for replies/ in question-bank order; cells not in `cells` get no reply yet."""
+    sections = to_sections(bank)
+    for section in sections:
+        section["questions"] = [ungraded_copy(cells[question["id"]]) if question["id"] in cells else question
+                                for question in section["questions"]]
+    return {"model": model, "sections": sections}
+
+def seed_journal(journal_path, model, document):
+    """Write the replies that are still valid into a fresh checkpoint journal, so raiq.py --resume asks only the rest."""
+    with Journal(journal_path, truncate=True) as journal:
+        for section in document["sections"]:
+            for question in section["questions"]:
+                if has_reply(question):
+                    journal.append({"model": model, "id": question["id"], "section": section["section_name"],
+                                    "question": question["question"], "reply": question["reply"],
+                                    "metrics": question.get("metrics"),
+                                    "samples": [sample["reply"] for sample in question["samples"]] if question.get("samples") else None})
+
+def carry_grades(replies_path, rated_path, cells):
+    """Write rated-replies/ from the refreshed replies file plus every grade that is still valid."""
+    data = load_results(replies_path)
+    for section in data["sections"]:
+        for question in section["questions"]:
+            cell = cells.get(question["id"])
+            if cell is None or cell.get("correct") is None or cell.get("reply") != question.get("reply"):
+                continue
+            for field in GRADE_FIELDS:
+                if field in cell:
+                    question[field] = cell[field]
+            if cell.get("samples") and question.get("samples") and len(cell["samples"]) == len(question["samples"]):
+                question["samples"] = cell["samples"]
+    save_results(rated_path, data)
+    return data
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run and re-grade only the (model, question) cells that changed.")
+    parser.add_argument("--input", default=DEFAULT_QUESTIONS, help=f"Question bank (default: {DEFAULT_QUESTIONS})")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--models-file", default=DEFAULT_MODELS_FILE, help=f"Models to evaluate, one per line (default: {DEFAULT_MODELS_FILE})")
+    target.add_argument("--model", action="append", dest="models", help="Evaluate this OR model (repeatable) instead of the models file")
+    parser.add_argument("--replies-dir", default=DEFAULT_REPLIES_DIR, help=f"Raw replies folder (default: {DEFAULT_REPLIES_DIR})")
+    parser.add_argument("--rated-dir", default=DEFAULT_RATED_DIR, help=f"Graded replies folder (default: {DEFAULT_RATED_DIR})")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the plan")
+    parser.add_argument("--grade", action="store_true", help="Run autograde.py on the cells that need grading afterwards")
+    add_request_arguments(parser)
+    args = parser.parse_args()
+    check_request_arguments(parser, args)
+    args.resume = True  # Valid replies are handed to raiq.py through its checkpoint journal
+
+    try:
+        bank = load_questions(args.input)
+    except QuestionFileError as e:
+        print(f"Error parsing questions file:\n{e}")
+        sys.exit(1)
+    except OSError as e:
+        print(f"Error reading questions file: {e}")
+        sys.exit(1)
+    try:
+        models = args.models or read_models_file(args.models_file)
+    except OSError as e:
+        print(f"Error reading models file: {e}")
+        sys.exit(1)
+    if not models:
+        print("No models to evaluate. Exiting.")
+        return
+
+    replies_files, rated_files = index_folder(args.replies_dir), index_folder(args.rated_dir)
+    plans, cells, paths = {}, {}, {}
+    for model in models:
+        replies_path = replies_files.get(model)
+        rated_path = rated_files.get(model)
+        if replies_path is None:
+            # Keep the name an existing graded file already uses
+            replies_path = (os.path.join(args.replies_dir, os.path.basename(rated_path)) if rated_path
+                            else output_path_for_model(args.replies_dir, model))
+        rated_path = rated_path or os.path.join(args.rated_dir, os.path.basename(replies_path))
+        paths[model] = (replies_path, rated_path)
+        try:
+            plans[model], cells[model] = plan_model(bank, load_cells(replies_files.get(model)), load_cells(rated_files.get(model)))
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read the results of '{model}': {e}")
+            sys.exit(1)
+    try:
+        check_distinct_paths({model: replies_path for model, (replies_path, _rated_path) in paths.items()})
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    untouched = sorted((set(replies_files) | set(rated_files)) - set(models))
+    print(f"{len(bank)} questions in {args.input}, {len(models)} models.")
+    totals = print_plan(plans, untouched)
+    if args.dry_run:
+        return
+
+    changed = [model for model, plan in plans.items() if plan["fetch"] or plan["grade"] or plan["drop"]]
+    if not changed:
+        print("Everything is up to date.")
+        return
+    os.makedirs(args.replies_dir, exist_ok=True)
+    os.makedirs(args.rated_dir, exist_ok=True)
+
+    to_fetch = [model for model in changed if plans[model]["fetch"]]
+    for model in changed:
+        document = build_document(model, bank, cells[model])
+        if model in to_fetch:
+            seed_journal(journal_path_for(paths[model][0]), model, document)
+        else:
+            save_results(paths[model][0], document)
+    if to_fetch:
+        load_dotenv()
+        api_key = os.getenv("OPENROUTER_KEY")
+        if not api_key:
+            raise ValueError("Please set the OPENROUTER_KEY environment variable in your .env file.")
+        workers = args.workers or args.concurrency * len(to_fetch)
+        print(f"\nFetching {totals['fetch']} replies from {len(to_fetch)} model(s)...")
+        try:
+            asyncio.run(run_sweep(to_fetch, to_sections(bank), api_key, {model: paths[model][0] for model in to_fetch}, args, workers))
+        except KeyboardInterrupt:
+            print("\nInterrupted. Rerun reeval.py to continue; replies received so far are kept.")
+            sys.exit(1)
+
+    ungraded = []
+    for model in changed:
+        replies_path, rated_path = paths[model]
+        if not os.path.exists(replies_path):
+            print(f"Error: '{replies_path}' was not written; leaving '{rated_path}' unchanged.")
+            continue
+        data = carry_grades(replies_path, rated_path, cells[model])
+        if any(question.get("correct") is None and not question.get("skipped")
+               for section in data["sections"] for question in section["questions"]):
+            ungraded.append(rated_path)
+        print(f"Updated {rated_path}")
+
+    if ungraded and args.grade:
+        from autograde import DEFAULT_MIN_CONFIDENCE, grade_file
+        from grade_index import build_index
+        grade_index = build_index(exclude=ungraded)
+        for rated_path in ungraded:
+            summary = grade_file(rated_path, rated_path, DEFAULT_MIN_CONFIDENCE, grade_index=grade_index)
+            tiers = ", ".join(f"{tier}: {count}" for tier, count in sorted(summary["tiers"].items())) or "nothing to grade"
+            print(f"{rated_path}: {summary['pending']} ungraded -> {tiers}")
+    if ungraded:
+        print("\nFinish grading with: python grade_server.py (or python redit.py <file>)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import json
+import time
+import sqlite3
+import hashlib
+
+DEFAULT_CACHE_PATH = ".raiq_cache.sqlite"
+
+def cache_key(model, system_prompt, question, max_tokens, temperature, sample=0):
+    """Content hash of everything that determines what a model replies.
+
+    `sample` tells apart repeated samples of the same request; sample 0 has
+    the same key as a plain single-sample run.
+    """
+    fields = [model, system_prompt, question, max_tokens, temperature]
+    if sample:
+        fields.append(sample)
+    material = json.dumps(fields, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class ReplyCache:
+    """Persistent SQLite store of replies keyed by `cache_key`.
+
+    Entries older than `max_age_days` are dropped, and once the stored replies
+    exceed `max_size_mb` the least recently used ones are evicted.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age_days=90, max_size_mb=256):
+        self.path = path
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.max_size = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS replies ("
+            " key TEXT PRIMARY KEY, model TEXT, question TEXT, reply TEXT,"
+            " size INTEGER, created REAL, accessed REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS replies_accessed ON replies (accessed)")
+        self.conn.commit()
+        self.evict()
+
+    def get(self, key):
+        """Return the cached reply for `key`, or None."""
+        row = self.conn.execute("SELECT reply, created FROM replies WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        reply, created = row
+        now = time.time()
+        if self.max_age is not None and now - created > self.max_age:
+            self.conn.execute("DELETE FROM replies WHERE key = ?", (key,))
+            self.conn.commit()
+            return None
+        self.conn.execute("UPDATE replies SET accessed = ? WHERE key = ?", (now, key))
+        self.conn.commit()
+        return reply
+
+    def put(self, key, model, question, reply):
+        """Store a reply. Empty replies are never cached."""
+        if not reply:
+            return
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO replies (key, model, question, reply, size, created, accessed)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, model, question, reply, len(reply.encode("utf-8")), now, now),
+        )
+        self.conn.commit()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under the size limit."""
+        if self.max_age is not None:
+            self.conn.execute("DELETE FROM replies WHERE created < ?", (time.time() - self.max_age,))
+        if self.max_size is not None:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM replies").fetchone()[0]
+            if total > self.max_size:
+                excess = total - self.max_size
+                doomed = []
+                for key, size in self.conn.execute("SELECT key, size FROM replies ORDER BY accessed"):
+                    if excess <= 0:
+                        break
+                    doomed.append((key,))
+                    excess -= size
+                self.conn.executemany("DELETE FROM replies WHERE key = ?", doomed)
+        self.conn.commit()
+
+    def close(self):
+        self.evict()
+        self.conn.close()
@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import stat
+import argparse
+import tempfile
+from questions import question_id
+
+try:
+    import ijson
+except ImportError:  # Optional: without it legacy JSON files are read in one piece
+    ijson = None
+
+JSONL_FORMAT = "raiq-replies"
+JSONL_VERSION = 1
+JOURNAL_SUFFIX = ".journal.jsonl"
+
+# Read once: os.umask can only be read by setting it, which would race with other threads
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def is_jsonl(path):
+    return path.lower().endswith(".jsonl")
+
+def list_results_files(folder):
+    """Sorted paths of the replies files (.json and .jsonl) in `folder`.
+
+    Journals (raiq.py checkpoints, redit.py and grade_server.py verdicts) are
+    JSONL files too and sit next to the results while a tool runs or after a
+    crash, so anything named *.journal.jsonl is left out, as are hidden files.
+    """
+    if not os.path.isdir(folder):
+        return []
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if name.lower().endswith((".json", ".jsonl")) and not name.lower().endswith(JOURNAL_SUFFIX)
+                  and not name.startswith("."))
+
+# --- Reading ---
+
+def _iter_legacy_json(path):
+    """Yield ("model", name) and ("question", section_name, question) from a {"model", "sections"} file."""
+    if ijson is None:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        yield ("model", data.get("model", "Unknown Model"))
+        for section in data.get("sections", []):
+            for question in section.get("questions", []):
+                yield ("question", section.get("section_name", "Unnamed Section"), question)
+        return
+
+    with open(path, 'rb') as f:
+        try:
+            yield from _parse_legacy_events(ijson.parse(f, use_float=True))
+        except ijson.JSONError as e:
+            # Match json.load, whose JSONDecodeError is a ValueError
+            raise ValueError(f"Invalid JSON in '{path}': {e}") from e
+
+def _parse_legacy_events(parser):
+    section_name = None
+    waiting = []    # Questions seen before their section's name (only if section_name comes last)
+    builder = None
+    for prefix, event, value in parser:
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == "sections.item.questions.item" and event == "end_map":
+                if section_name is None:
+                    waiting.append(builder.value)
+                else:
+                    yield ("question", section_name, builder.value)
+                builder = None
+        elif prefix == "sections.item.questions.item" and event == "start_map":
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+        elif prefix == "model" and event == "string":
+            yield ("model", value)
+        elif prefix == "sections.item" and event == "start_map":
+            section_name, waiting = None, []
+        elif prefix == "sections.item.section_name" and event == "string":
+            section_name = value
+            for question in waiting:
+                yield ("question", section_name, question)
+            waiting = []
+        elif prefix == "sections.item" and event == "end_map":
+            for question in waiting:
+                yield ("question", "Unnamed Section", question)
+            waiting = []
+
+def _read_jsonl_records(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A torn last line from an interrupted append
+
+def _iter_jsonl(path):
+    """Yield the same events as _iter_legacy_json from a JSONL replies file.
+
+    Update records appended after a question are applied to it. A first pass
+    collects only the updates, so memory grows with the number of edits, not
+    with the size of the file.
+    """
+    updates = {}
+    for record in _read_jsonl_records(path):
+        if record.get("type") == "update":
+            updates.setdefault(record["id"], {}).update(record.get("fields", {}))
+    for record in _read_jsonl_records(path):
+        kind = record.get("type")
+        if kind == "header":
+            yield ("model", record.get("model", "Unknown Model"))
+        elif kind == "question":
+            question = record["question"]
+            question.update(updates.get(question.get("id"), {}))
+            yield ("question", record.get("section", "Unnamed Section"), question)
+
+def iter_questions(path):
+    """Yield (section_name, question) one at a time from a JSON or JSONL replies file."""
+    events = _iter_jsonl(path) if is_jsonl(path) else _iter_legacy_json(path)
+    for event in events:
+        if event[0] == "question":
+            yield event[1], event[2]
+
+def read_model(path):
+    """The model name of a replies file, reading no further than needed."""
+    events = _iter_jsonl(path) if is_jsonl(path) else _iter_legacy_json(path)
+    for event in events:
+        if event[0] == "model":
+            return event[1]
+    return "Unknown Model"
+
+def load_results(path):
+    """Load a whole replies file (JSON or JSONL) as a {"model", "sections"} document."""
+    events = _iter_jsonl(path) if is_jsonl(path) else _iter_legacy_json(path)
+    model = "Unknown Model"
+    sections = []
+    for event in events:
+        if event[0] == "model":
+            model = event[1]
+            continue
+        _kind, section_name, question = event
+        if not sections or sections[-1]["section_name"] != section_name:
+            sections.append({"section_name": section_name, "questions": []})
+        sections[-1]["questions"].append(question)
+    return {"model": model, "sections": sections}
+
+# --- Writing ---
+
+def _file_mode(path):
+    """Permissions a rewrite of `path` should keep: its current ones, or what open() would give a new file."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+def _atomic_write(path, write):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        # mkstemp creates the file 0600, and os.replace would hand that to the shared replies file
+        if hasattr(os, "fchmod"):
+            os.fchmod(fd, _file_mode(path))
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def write_jsonl(path, model, questions):
+    """Atomically write a JSONL replies file from (section_name, question) pairs, which may be a generator."""
+    def write(f):
+        f.write(json.dumps({"type": "header", "format": JSONL_FORMAT, "version": JSONL_VERSION, "model": model}) + "\n")
+        for section_name, question in questions:
+            if "id" not in question:
+                question = {"id": question_id(question.get("question", "")), **question}
+            f.write(json.dumps({"type": "question", "section": section_name, "question": question}) + "\n")
+    _atomic_write(path, write)
+
+def write_legacy_json(path, data):
+    """Atomically write a {"model", "sections"} document in the original indented JSON format."""
+    _atomic_write(path, lambda f: json.dump(data, f, indent=4))
+
+def save_results(path, data):
+    """Atomically write a {"model", "sections"} document in the format the path's extension implies."""
+    if is_jsonl(path):
+        pairs = ((section["section_name"], question) for section in data.get("sections", []) for question in section.get("questions", []))
+        write_jsonl(path, data.get("model", "Unknown Model"), pairs)
+    else:
+        write_legacy_json(path, data)
+
+def append_updates(path, updates):
+    """Append {question id: {field: value}} edits to a JSONL file instead of rewriting it."""
+    with open(path, 'a', encoding='utf-8') as f:
+        for qid, fields in updates.items():
+            f.write(json.dumps({"type": "update", "id": qid, "fields": fields}) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def convert(src, dst):
+    """Convert between the legacy JSON and the JSONL format, streaming where possible."""
+    if is_jsonl(dst):
+        write_jsonl(dst, read_model(src), iter_questions(src))
+    else:
+        write_legacy_json(dst, load_results(src))
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert replies files between the JSON and JSONL formats.")
+    parser.add_argument("source", help="Replies file to read (.json or .jsonl)")
+    parser.add_argument("destination", help="Replies file to write; the extension picks the format")
+    args = parser.parse_args()
+    try:
+        convert(args.source, args.destination)
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not convert '{args.source}': {e}")
+        sys.exit(1)
+    print(f"Converted '{args.source}' to '{args.destination}'")
+
+if __name__ == "__main__":
+    main()
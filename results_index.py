@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import hashlib
+from questions import file_digest, question_id
+from reply_io import iter_questions, list_results_files, read_model
+
+DEFAULT_INDEX_PATH = ".results_index.sqlite"
+SCHEMA_VERSION = 2  # Bumped whenever what is indexed changes, so older indexes are rebuilt
+
+class ResultsIndex:
+    """Compact SQLite table of graded results, one row per (file, question).
+
+    Only the fields needed for scoring are kept, so reports never have to
+    parse reply bodies. A file is re-read only when its size or mtime changed
+    and its content hash no longer matches.
+    """
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.conn = sqlite3.connect(path)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(results)")]
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if columns and version < SCHEMA_VERSION:
+            # Index written by an older version: it is only a cache, so rebuild it
+            self.conn.executescript("DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS results; DROP TABLE IF EXISTS samples;"
+                                    " DROP TABLE IF EXISTS renders;")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, model TEXT, mtime REAL, size INTEGER, sha256 TEXT);"
+            "CREATE TABLE IF NOT EXISTS results ("
+            " path TEXT, model TEXT, section TEXT, section_pos INTEGER, question_pos INTEGER,"
+            " question_id TEXT, correct INTEGER, latency REAL, cost REAL);"
+            "CREATE INDEX IF NOT EXISTS results_path ON results (path);"
+            # Repeated samples (raiq.py --samples), one row per (file, question, sample); correct is NULL until graded
+            "CREATE TABLE IF NOT EXISTS samples ("
+            " path TEXT, model TEXT, question_id TEXT, sample INTEGER, correct INTEGER);"
+            "CREATE INDEX IF NOT EXISTS samples_path ON samples (path);"
+            # Inputs digest each chart or report was last drawn from, so unchanged ones are not redrawn
+            "CREATE TABLE IF NOT EXISTS renders (output TEXT PRIMARY KEY, digest TEXT);"
+            f"PRAGMA user_version = {SCHEMA_VERSION};"
+        )
+        self.conn.commit()
+
+    def refresh(self, folder):
+        """Bring the index up to date with the replies files in `folder`.
+
+        Returns (updated, unchanged, removed) file counts.
+        """
+        updated = unchanged = 0
+        seen = set()
+        known = {row[0]: row[1:] for row in self.conn.execute("SELECT path, mtime, size, sha256 FROM files")}
+        for filepath in list_results_files(folder):
+            seen.add(filepath)
+            stat = os.stat(filepath)
+            previous = known.get(filepath)
+            if previous is not None and previous[0] == stat.st_mtime and previous[1] == stat.st_size:
+                unchanged += 1
+                continue
+            digest = file_digest(filepath)
+            if previous is not None and previous[2] == digest:
+                # Touched but not changed: remember the new mtime so the next check is stat-only
+                self.conn.execute("UPDATE files SET mtime = ?, size = ? WHERE path = ?", (stat.st_mtime, stat.st_size, filepath))
+                unchanged += 1
+                continue
+            try:
+                self._load_file(filepath, stat, digest)
+                updated += 1
+            except (OSError, ValueError) as e:
+                print(f"Error: Could not index '{filepath}': {e}")
+
+        removed = [(path,) for path in known if path.startswith(os.path.join(folder, "")) and path not in seen]
+        self.conn.executemany("DELETE FROM files WHERE path = ?", removed)
+        self.conn.executemany("DELETE FROM results WHERE path = ?", removed)
+        self.conn.executemany("DELETE FROM samples WHERE path = ?", removed)
+        self.conn.commit()
+        return updated, unchanged, len(removed)
+
+    def _load_file(self, filepath, stat, digest):
+        # Streamed one question at a time; reply bodies are dropped as soon as they are read
+        model = read_model(filepath)
+        rows = []
+        sample_rows = []
+        section_pos, question_pos, current_section = -1, 0, None
+        for section_name, question in iter_questions(filepath):
+            if section_name != current_section:
+                section_pos, question_pos, current_section = section_pos + 1, 0, section_name
+            correct = question.get('correct')
+            metrics = question.get('metrics') or {}
+            qid = question.get('id') or question_id(question.get('question', ''))
+            rows.append((filepath, model, section_name, section_pos, question_pos, qid,
+                         None if correct is None else int(correct is True), metrics.get('latency'), metrics.get('cost')))
+            for sample, entry in enumerate(question.get('samples') or []):
+                sample_correct = entry.get('correct')
+                sample_rows.append((filepath, model, qid, sample, None if sample_correct is None else int(sample_correct is True)))
+            question_pos += 1
+        self.conn.execute("DELETE FROM results WHERE path = ?", (filepath,))
+        self.conn.executemany("INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self.conn.execute("DELETE FROM samples WHERE path = ?", (filepath,))
+        self.conn.executemany("INSERT INTO samples VALUES (?, ?, ?, ?, ?)", sample_rows)
+        self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                          (filepath, model, stat.st_mtime, stat.st_size, digest))
+
+    def files(self, folder):
+        """(path, model) of every indexed file in `folder`, sorted by path."""
+        prefix = os.path.join(folder, "")
+        return [row for row in self.conn.execute("SELECT path, model FROM files ORDER BY path") if row[0].startswith(prefix)]
+
+    def digest(self, folder):
+        """SHA-256 over the paths and content hashes of every indexed file in `folder`.
+
+        Changes whenever any results file is added, removed or edited, so it
+        can tell whether anything derived from the folder is out of date.
+        """
+        prefix = os.path.join(folder, "")
+        digest = hashlib.sha256()
+        for path, sha256 in self.conn.execute("SELECT path, sha256 FROM files ORDER BY path"):
+            if path.startswith(prefix):
+                digest.update(f"{path}\0{sha256}\n".encode("utf-8"))
+        return digest.hexdigest()
+
+    def rows(self, folder):
+        """All result rows for files in `folder`, without any reply text."""
+        prefix = os.path.join(folder, "")
+        return self.conn.execute(
+            "SELECT path, model, section, section_pos, question_pos, question_id, correct, latency, cost"
+            " FROM results WHERE substr(path, 1, ?) = ? ORDER BY path, section_pos, question_pos",
+            (len(prefix), prefix),
+        ).fetchall()
+
+    def sample_rows(self, folder):
+        """(path, model, question_id, sample, correct) of every sample in `folder`; correct is None if ungraded."""
+        prefix = os.path.join(folder, "")
+        return self.conn.execute(
+            "SELECT path, model, question_id, sample, correct FROM samples"
+            " WHERE substr(path, 1, ?) = ? ORDER BY path, question_id, sample",
+            (len(prefix), prefix),
+        ).fetchall()
+
+    def rendered(self, output):
+        """Digest of the inputs `output` was last rendered from, or None."""
+        row = self.conn.execute("SELECT digest FROM renders WHERE output = ?", (output,)).fetchone()
+        return row[0] if row else None
+
+    def set_rendered(self, output, digest):
+        self.conn.execute("INSERT OR REPLACE INTO renders VALUES (?, ?)", (output, digest))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
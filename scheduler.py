@@ -0,0 +1,201 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from questions import question_id
+from reply_io import iter_questions, list_results_files, read_model
+
+# --- Configuration ---
+DEFAULT_HISTORY_DIR = "replies"
+# Used to turn a reply's length into a latency when an old run recorded no metrics
+CHARS_PER_TOKEN = 4
+FALLBACK_TTFT = 1.0            # Seconds
+FALLBACK_TOKENS_PER_SEC = 50.0
+DEFAULT_LATENCY = 10.0         # Seconds, for questions no model has answered before
+# --- End Configuration ---
+
+class RunStopped(Exception):
+    """Raised instead of sending a request once the run's budget or deadline is used up."""
+    def __init__(self, reason):
+        self.reason = reason
+        super().__init__(f"Skipped: {reason} reached")
+
+def _mean(values):
+    return sum(values) / len(values) if values else None
+
+class CostModel:
+    """Expected latency and cost of each (model, question), learned from earlier replies files.
+
+    A question's own history for the model is used first, then the model's
+    average for the section, then the section's average over other models
+    scaled by how fast this model is relative to the rest, then the model's
+    overall average. Replies without metrics count by their length.
+    """
+    def __init__(self):
+        self.latency = {}  # (model, question id) -> [seconds, ...]
+        self.cost = {}     # (model, question id) -> [credits, ...]
+        self.sections = {} # question id -> section name
+
+    def add(self, model, section, question):
+        metrics = question.get("metrics") or {}
+        reply = question.get("reply")
+        if metrics.get("latency") is not None:
+            latency = metrics["latency"]
+        elif reply:
+            latency = FALLBACK_TTFT + len(reply) / CHARS_PER_TOKEN / FALLBACK_TOKENS_PER_SEC
+        else:
+            return
+        qid = question.get("id") or question_id(question.get("question", ""))
+        self.sections[qid] = section
+        self.latency.setdefault((model, qid), []).append(latency)
+        if metrics.get("cost") is not None:
+            self.cost.setdefault((model, qid), []).append(metrics["cost"])
+
+    def add_folder(self, folder):
+        """Learn from every replies file in `folder`. Returns the number of files read."""
+        read = 0
+        for filepath in list_results_files(folder):
+            try:
+                model = read_model(filepath)
+                for section, question in iter_questions(filepath):
+                    self.add(model, section, question)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read history from '{filepath}': {e}")
+                continue
+            read += 1
+        self._summarize()
+        return read
+
+    def _summarize(self):
+        by_model, by_model_section, by_section = {}, {}, {}
+        for (model, qid), values in self.latency.items():
+            value = _mean(values)
+            section = self.sections[qid]
+            by_model.setdefault(model, []).append(value)
+            by_model_section.setdefault((model, section), []).append(value)
+            by_section.setdefault(section, []).append(value)
+        self.model_mean = {model: _mean(values) for model, values in by_model.items()}
+        self.model_section_mean = {key: _mean(values) for key, values in by_model_section.items()}
+        self.section_mean = {section: _mean(values) for section, values in by_section.items()}
+        overall = _mean(list(self.model_mean.values()))
+        # How much slower than the average model each model is
+        self.model_factor = {model: mean / overall for model, mean in self.model_mean.items()} if overall else {}
+        costs = {}
+        for (model, _qid), values in self.cost.items():
+            costs.setdefault(model, []).extend(values)
+        self.model_cost = {model: _mean(values) for model, values in costs.items()}
+
+    def expected(self, model, section, qid):
+        """(expected latency in seconds, expected cost or 0.0 if unknown) of one request."""
+        cost = _mean(self.cost.get((model, qid), [])) or self.model_cost.get(model) or 0.0
+        history = self.latency.get((model, qid))
+        if history:
+            return _mean(history), cost
+        if (model, section) in self.model_section_mean:
+            return self.model_section_mean[(model, section)], cost
+        if section in self.section_mean:
+            return self.section_mean[section] * self.model_factor.get(model, 1.0), cost
+        return self.model_mean.get(model, DEFAULT_LATENCY), cost
+
+def load_cost_model(folder=DEFAULT_HISTORY_DIR):
+    model = CostModel()
+    if os.path.isdir(folder):
+        model.add_folder(folder)
+    else:
+        model._summarize()
+    return model
+
+class PrioritySemaphore:
+    """A semaphore that wakes the waiter with the highest priority first, FIFO among equals.
+
+    Used for the worker pool shared by all models, so that across models the
+    longest expected requests start first (longest-processing-time scheduling,
+    which keeps a slow request from starting last and setting the makespan).
+    """
+    def __init__(self, value):
+        self.value = value
+        self.waiters = []  # heap of (-priority, sequence, future)
+        self.sequence = itertools.count()
+
+    async def acquire(self, priority=0.0):
+        if self.value > 0 and not self.waiters:
+            self.value -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = (-priority, next(self.sequence), future)
+        heapq.heappush(self.waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # Woken and cancelled at the same time: pass the slot on
+            elif entry in self.waiters:  # release() may already have popped it as a dead waiter
+                self.waiters.remove(entry)
+                heapq.heapify(self.waiters)
+            raise
+
+    def release(self):
+        while self.waiters:
+            _priority, _sequence, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None)  # The slot goes straight to the waiter
+                return
+        self.value += 1
+
+    def slot(self, priority=0.0):
+        return _Slot(self, priority)
+
+class _Slot:
+    def __init__(self, semaphore, priority):
+        self.semaphore = semaphore
+        self.priority = priority
+
+    async def __aenter__(self):
+        await self.semaphore.acquire(self.priority)
+
+    async def __aexit__(self, *exc_info):
+        self.semaphore.release()
+
+class RunLimits:
+    """Shared cost budget and deadline for a run.
+
+    Every request reserves its expected cost before it is sent and settles
+    the actual cost when it returns. Once a request would overrun the budget
+    the run stops: it and every later request raise RunStopped, while
+    requests already in flight finish. A request that could not finish
+    before the deadline raises RunStopped too, but shorter ones still run.
+    `stopped` is the reason the results are partial, if they are.
+    """
+    def __init__(self, budget=None, deadline=None):
+        self.budget = budget
+        self.deadline = time.monotonic() + deadline if deadline else None
+        self.spent = 0.0
+        self.reserved = 0.0
+        self.stopped = None
+        self.out_of_budget = False
+
+    def reserve(self, expected_latency, expected_cost):
+        if not self.out_of_budget and self.budget is not None:
+            self.out_of_budget = (self.spent >= self.budget
+                                  or self.spent + self.reserved + expected_cost > self.budget)
+        if self.out_of_budget:
+            self.stopped = "budget"
+            raise RunStopped("budget")
+        if self.deadline is not None and time.monotonic() + expected_latency > self.deadline:
+            self.stopped = self.stopped or "deadline"
+            raise RunStopped("deadline")
+        self.reserved += expected_cost
+
+    def settle(self, expected_cost, actual_cost=None):
+        self.reserved -= expected_cost
+        self.spent += actual_cost if actual_cost is not None else expected_cost
+
+def parse_duration(text):
+    """Seconds in '90', '90s', '30m' or '2h'."""
+    text = text.strip().lower()
+    scale = {"s": 1, "m": 60, "h": 3600}.get(text[-1:], None)
+    value = float(text[:-1] if scale else text)
+    if value <= 0:
+        raise ValueError("duration must be positive")
+    return value * (scale or 1)
@@ -0,0 +1,223 @@
+import sys
+import json
+import math
+import time
+from datetime import datetime, timezone
+
+DEFAULT_METRICS_PATH = "run_metrics.json"
+PROGRESS_INTERVAL = 0.2       # Seconds between redraws of the live progress line
+LOG_PROGRESS_INTERVAL = 10.0  # Seconds between progress lines when stdout is not a terminal
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers, or None if it is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+def distribution(values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {
+        "mean": round(sum(values) / len(values), 3),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "p99": percentile(values, 0.99),
+        "max": max(values),
+    }
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}" if seconds >= 3600 else f"{seconds // 60}:{seconds % 60:02d}"
+
+class RunTelemetry:
+    """Collects the metrics of every answered question and shows a live progress line.
+
+    On a terminal the progress line is redrawn in place and other messages
+    are printed above it; otherwise each question keeps its own log line and
+    a progress line is added every LOG_PROGRESS_INTERVAL seconds.
+    """
+    def __init__(self, total, stream=None):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0
+        self.cost = 0.0
+        self.records = {}  # model -> [metrics, ...] of answered (not cached) questions
+        self.cached = {}
+        self.failures = {}
+        self.skips = {}
+        self.started = time.monotonic()
+        self.started_at = datetime.now(timezone.utc)
+        self.stream = stream or sys.stdout
+        self.live = self.stream.isatty()
+        self.last_draw = 0.0
+        self.line_shown = False
+
+    def record(self, model, metrics=None, failed=False, skipped=False):
+        """Count one finished question: answered (with metrics), cached (metrics None), failed or skipped."""
+        self.done += 1
+        if skipped:
+            self.skipped += 1
+            self.skips[model] = self.skips.get(model, 0) + 1
+        elif failed:
+            self.failed += 1
+            self.failures[model] = self.failures.get(model, 0) + 1
+        elif metrics is None:
+            self.cached[model] = self.cached.get(model, 0) + 1
+        else:
+            self.records.setdefault(model, []).append(metrics)
+            self.cost += metrics.get("cost") or 0.0
+
+    def progress_line(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        line = f"[{self.done}/{self.total}] {rate:.2f} q/s, elapsed {format_duration(elapsed)}"
+        if 0 < self.done < self.total and rate > 0:
+            line += f", ETA {format_duration((self.total - self.done) / rate)}"
+        if self.failed:
+            line += f", {self.failed} failed"
+        if self.skipped:
+            line += f", {self.skipped} skipped"
+        if self.cost:
+            line += f", ${self.cost:.4f}"
+        return line
+
+    def log(self, message):
+        """Print a message without garbling the live progress line."""
+        if self.live and self.line_shown:
+            self.stream.write("\r\033[K")
+            self.line_shown = False
+        print(message, file=self.stream)
+        if self.live:
+            self.draw(force=True)
+
+    def draw(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_draw < PROGRESS_INTERVAL:
+            return
+        self.last_draw = now
+        self.stream.write("\r\033[K" + self.progress_line())
+        self.stream.flush()
+        self.line_shown = True
+
+    def question_done(self, message):
+        """Report a finished question: redraw the live line, or log `message` plus periodic progress."""
+        if self.live:
+            self.draw(force=self.done == self.total)
+            return
+        print(message, file=self.stream)
+        now = time.monotonic()
+        if now - self.last_draw >= LOG_PROGRESS_INTERVAL or self.done == self.total:
+            self.last_draw = now
+            print(f"Progress: {self.progress_line()}", file=self.stream)
+
+    def finish(self):
+        if self.live and self.line_shown:
+            self.stream.write("\n")
+            self.line_shown = False
+
+    def report(self, clients, stopped=None):
+        """Run-level metrics: per model and in total. `clients` maps model -> ModelClient.
+
+        `stopped` is why the run ended early ("budget" or "deadline"), if it did.
+        """
+        elapsed = time.monotonic() - self.started
+        models = {}
+        for model, client in clients.items():
+            records = self.records.get(model, [])
+
+            def total(field):
+                return sum(metrics.get(field) or 0 for metrics in records)
+
+            providers = {}
+            for metrics in records:
+                name = metrics.get("provider") or "unknown"
+                providers[name] = providers.get(name, 0) + 1
+            models[model] = {
+                "answered": len(records),
+                "cached": self.cached.get(model, 0),
+                "failed": self.failures.get(model, 0),
+                "skipped": self.skips.get(model, 0),
+                "requests": client.stats.requests,
+                "retries": client.stats.retries,
+                "throttled": client.stats.throttled,
+                "throttle_seconds": round(client.stats.throttle_seconds, 2),
+                "final_rate": round(client.limiter.rate, 2),
+                "http_status": dict(client.stats.statuses),
+                "providers": providers,
+                "new_connections": sum(1 for metrics in records if metrics.get("connect")),
+                "prompt_tokens": total("prompt_tokens"),
+                "completion_tokens": total("completion_tokens"),
+                "reasoning_tokens": total("reasoning_tokens"),
+                "cached_tokens": total("cached_tokens"),
+                # Share of prompt tokens the provider served from its prompt cache
+                "prompt_cache_hit_rate": round(total("cached_tokens") / total("prompt_tokens"), 4) if total("prompt_tokens") else None,
+                "cost": round(total("cost"), 6),
+                "latency": distribution([metrics.get("latency") for metrics in records]),
+                "ttfb": distribution([metrics.get("ttfb") for metrics in records]),
+                "ttft": distribution([metrics.get("ttft") for metrics in records]),
+                "connect": distribution([metrics.get("connect") for metrics in records if metrics.get("connect")]),
+                "tokens_per_sec": distribution([metrics.get("tokens_per_sec") for metrics in records]),
+            }
+        return {
+            "started": self.started_at.isoformat(timespec="seconds"),
+            "seconds": round(elapsed, 2),
+            "questions": self.total,
+            "completed": self.done,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "partial": stopped,
+            "questions_per_sec": round(self.done / elapsed, 3) if elapsed > 0 else None,
+            "cost": round(sum(stats["cost"] for stats in models.values()), 6),
+            "cached_tokens": sum(stats["cached_tokens"] for stats in models.values()),
+            "models": models,
+        }
+
+def write_metrics_json(path, report):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def write_prometheus(path, report):
+    """Write the report in the Prometheus text exposition format (e.g. for node_exporter's textfile collector)."""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if value is None:
+                continue
+            label_text = ",".join(f'{key}="{_label(val)}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    models = report["models"]
+    metric("raiq_run_seconds", "gauge", "Wall-clock duration of the run.", [({}, report["seconds"])])
+    metric("raiq_run_questions_per_second", "gauge", "Questions completed per second over the run.", [({}, report["questions_per_sec"])])
+    for field, help_text in (("answered", "Questions answered by the API."), ("cached", "Questions answered from the reply cache."),
+                             ("failed", "Questions left without a reply."), ("skipped", "Questions not asked because the budget or deadline ran out."),
+                             ("requests", "HTTP requests sent."),
+                             ("retries", "Requests that were retries."), ("throttled", "Requests answered with 429.")):
+        metric(f"raiq_{field}_total", "counter", help_text, [({"model": model}, stats[field]) for model, stats in models.items()])
+    metric("raiq_tokens_total", "counter", "Tokens used, by kind; cached prompt tokens are included in prompt.",
+           [({"model": model, "kind": kind}, stats[f"{kind}_tokens"])
+            for model, stats in models.items() for kind in ("prompt", "completion", "reasoning", "cached")])
+    metric("raiq_prompt_cache_hit_ratio", "gauge", "Share of prompt tokens served from the provider's prompt cache.",
+           [({"model": model}, stats["prompt_cache_hit_rate"]) for model, stats in models.items()])
+    metric("raiq_cost_total", "counter", "Cost reported by the API, in credits (USD).", [({"model": model}, stats["cost"]) for model, stats in models.items()])
+    metric("raiq_http_responses_total", "counter", "HTTP responses by status.",
+           [({"model": model, "status": status}, count) for model, stats in models.items() for status, count in stats["http_status"].items()])
+    for field, help_text in (("latency", "Total request time."), ("ttfb", "Time to response headers."),
+                             ("ttft", "Time to first streamed token."), ("connect", "Time to open a new connection.")):
+        samples = []
+        for model, stats in models.items():
+            dist = stats[field] or {}
+            for quantile, key in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+                samples.append(({"model": model, "quantile": quantile}, dist.get(key)))
+        metric(f"raiq_{field}_seconds", "summary", help_text, samples)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
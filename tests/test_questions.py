@@ -0,0 +1,68 @@
+import hashlib
+import os
+
+import pytest
+
+from questions import QuestionFileError, file_digest, iter_questions, load_questions, question_id, to_sections
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def baseline_parse(file_path):
+    """The parser raiq.py used before questions.py, minus its error handling."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        lines = f.readlines()
+    sections = []
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        if line.startswith("###"):
+            current_section = {"section_name": line[3:].strip(), "questions": []}
+            sections.append(current_section)
+            i += 1
+        elif line.startswith("Q:"):
+            question = line[2:].strip()
+            i += 1
+            if i < len(lines) and lines[i].strip().startswith("A:"):
+                current_section["questions"].append({"question": question, "expected_answer": lines[i][2:].strip()})
+                i += 1
+            else:
+                raise ValueError(f"Expected 'A:' after 'Q:' at line {i}")
+        else:
+            i += 1
+    return sections
+
+def without_ids(sections):
+    return [{"section_name": s["section_name"],
+             "questions": [{k: v for k, v in q.items() if k != "id"} for q in s["questions"]]} for s in sections]
+
+def test_streaming_parser_matches_the_baseline_on_questions_txt(tmp_path):
+    path = os.path.join(REPO, "questions.txt")
+    sections = to_sections(load_questions(path, cache_dir=str(tmp_path)))
+    assert without_ids(sections) == baseline_parse(path)
+    assert sum(len(s["questions"]) for s in sections) > 0
+
+def test_cached_load_returns_the_same_questions(tmp_path):
+    path = os.path.join(REPO, "questions.txt")
+    first = load_questions(path, cache_dir=str(tmp_path))
+    assert os.listdir(tmp_path) == [f"{file_digest(path)}.v1.pickle"]
+    assert load_questions(path, cache_dir=str(tmp_path)) == first
+
+def test_multi_line_answers_and_ids(tmp_path):
+    path = tmp_path / "q.txt"
+    path.write_text("### EASY\nQ: Who is   the\nprotagonist?\nA: Sunny\n(or Omori)\n\nQ: Next?\nA: Yes\n", encoding="utf-8")
+    first, second = iter_questions(str(path))
+    assert (first.section, first.question, first.expected_answer, first.line) == ("EASY", "Who is   the protagonist?", "Sunny\n(or Omori)", 2)
+    assert first.id == question_id("Who is the protagonist?") == question_id(" Who  is the\tprotagonist? ")
+    assert second.id != first.id
+
+def test_every_problem_is_reported(tmp_path):
+    path = tmp_path / "q.txt"
+    path.write_text("Q: Orphan?\nA: x\n### S\nQ: No answer\nQ: Dup\nA: 1\nQ: Dup\nA: 2\nA: stray\n", encoding="utf-8")
+    with pytest.raises(QuestionFileError) as error:
+        load_questions(str(path), cache_dir=None)
+    assert sorted(line for line, _message in error.value.diagnostics) == [1, 4, 7, 9]
+
+def test_file_digest_is_the_sha256_of_the_file(tmp_path):
+    path = tmp_path / "f.bin"
+    path.write_bytes(b"x" * (3 << 20))
+    assert file_digest(str(path)) == hashlib.sha256(b"x" * (3 << 20)).hexdigest()
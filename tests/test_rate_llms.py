@@ -0,0 +1,54 @@
+import math
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from rate_llms import mcnemar_pvalues, pass_at_k, sampling_stats
+
+def exact_mcnemar(b, c):
+    """Two-sided exact McNemar p-value from the discordant counts, with integer arithmetic."""
+    n, k = b + c, min(b, c)
+    if n == 0:
+        return 1.0
+    return float(min(Fraction(1), Fraction(2 * sum(math.comb(n, i) for i in range(k + 1)), 2 ** n)))
+
+def models(*rows):
+    """(correct, answered) matrices from rows of 'R' (right), 'W' (wrong) and '-' (not answered)."""
+    correct = np.array([[cell == "R" for cell in row] for row in rows])
+    answered = np.array([[cell != "-" for cell in row] for row in rows])
+    return correct, answered
+
+def test_mcnemar_matches_the_exact_binomial_test():
+    correct, answered = models("RRRWWR-RR", "RWWWRW-WR", "WRRRR-WWW")
+    pvalues = mcnemar_pvalues(correct, answered)
+    assert pvalues[0, 1] == pytest.approx(exact_mcnemar(4, 1))
+    assert pvalues[0, 2] == pytest.approx(exact_mcnemar(3, 2))  # Questions either model skipped don't count
+    assert pvalues[1, 2] == pytest.approx(exact_mcnemar(2, 3))
+    assert np.allclose(pvalues, pvalues.T) and np.all(np.diag(pvalues) == 1.0)
+
+@pytest.mark.parametrize("b, c", [(1600, 1400), (700, 324), (2000, 2000), (5000, 10)])
+def test_mcnemar_with_thousands_of_discordant_pairs(b, c):
+    correct, answered = models("R" * b + "W" * c + "R" * 50, "W" * b + "R" * c + "R" * 50)
+    with np.errstate(over="raise", invalid="raise"):
+        pvalue = mcnemar_pvalues(correct, answered)[0, 1]
+    assert pvalue == pytest.approx(exact_mcnemar(b, c), rel=1e-9, abs=1e-300)
+
+@pytest.mark.parametrize("n, c, k", [(1, 0, 1), (1, 1, 1), (5, 2, 1), (5, 2, 3), (5, 2, 4), (10, 10, 10), (200, 3, 50)])
+def test_pass_at_k_is_the_unbiased_estimator(n, c, k):
+    assert pass_at_k([n], [c], k)[0] == pytest.approx(1 - math.comb(n - c, k) / math.comb(n, k))
+
+def test_questions_with_ungraded_samples_are_left_out(capsys):
+    rows = [("a.json", "p/a", "q1", 0, True), ("a.json", "p/a", "q1", 1, False), ("a.json", "p/a", "q1", 2, True),
+            ("a.json", "p/a", "q2", 0, True), ("a.json", "p/a", "q2", 1, None), ("a.json", "p/a", "q2", 2, True),
+            ("a.json", "p/a", "q3", 0, False), ("a.json", "p/a", "q3", 1, False), ("a.json", "p/a", "q3", 2, False),
+            ("b.json", "p/b", "q1", 0, None), ("b.json", "p/b", "q1", 1, True)]
+    stats = sampling_stats(rows)
+    assert list(stats) == ["p/a"]
+    assert "No question of b has all of its samples graded" in capsys.readouterr().out
+    row = stats["p/a"]
+    assert (row["questions"], row["samples"], row["undecided"]) == (2, 3, 1)
+    assert row["pass@k"] == {1: pytest.approx(100 / 3), 3: pytest.approx(50.0)}
+    assert row["majority"] == pytest.approx(50.0)
+    assert row["agreement"] == pytest.approx(100 * (2 / 3 + 1) / 2)
+    assert set(row["agreement_by_question"]) == {"q1", "q3"}
@@ -0,0 +1,63 @@
+import os
+import stat
+
+from reply_io import (_UMASK, append_updates, convert, iter_questions, list_results_files, load_results,
+                      save_results, write_jsonl)
+from results_index import ResultsIndex
+
+DOCUMENT = {"model": "p/m", "sections": [{"section_name": "EASY", "questions": [{"question": "Q?", "reply": "R"}]}]}
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+def test_save_keeps_the_mode_of_an_existing_file(tmp_path):
+    for name in ("replies.json", "replies.jsonl"):
+        path = tmp_path / name
+        path.write_text("{}")
+        os.chmod(path, 0o644)
+        save_results(str(path), DOCUMENT)
+        assert mode(path) == 0o644
+
+def test_new_file_gets_the_default_mode(tmp_path):
+    path = tmp_path / "new.json"
+    save_results(str(path), DOCUMENT)
+    assert mode(path) == 0o666 & ~_UMASK
+
+def test_results_files_leave_out_journals(tmp_path):
+    for name in ("a.json", "b.jsonl", "a.json.journal.jsonl", "b.jsonl.grading.journal.jsonl",
+                 ".grade_server.journal.jsonl", "notes.txt"):
+        (tmp_path / name).write_text("")
+    assert list_results_files(str(tmp_path)) == [str(tmp_path / "a.json"), str(tmp_path / "b.jsonl")]
+    assert list_results_files(str(tmp_path / "missing")) == []
+
+def test_results_index_skips_journals(tmp_path):
+    folder = tmp_path / "rated"
+    folder.mkdir()
+    save_results(str(folder / "m.json"), DOCUMENT)
+    (folder / ".grade_server.journal.jsonl").write_text('{"file": "m.json", "id": "x", "correct": true}\n')
+    (folder / "m.json.grading.journal.jsonl").write_text('{"id": "x", "correct": true}\n')
+    index = ResultsIndex(str(tmp_path / "index.sqlite"))
+    assert index.refresh(str(folder)) == (1, 0, 0)
+    assert index.files(str(folder)) == [(str(folder / "m.json"), "p/m")]
+    index.close()
+
+def test_jsonl_updates_merge_into_their_question(tmp_path):
+    path = str(tmp_path / "m.jsonl")
+    write_jsonl(path, "p/m", [("EASY", {"id": "a", "question": "A?", "reply": "1"}),
+                              ("HARD", {"id": "b", "question": "B?", "reply": "2"})])
+    append_updates(path, {"a": {"correct": False, "comment": "off"}})
+    append_updates(path, {"a": {"correct": True}, "b": {"correct": False}})
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"type": "update", "id": "b", "fie')  # torn by a crash mid-append
+    assert load_results(path) == {"model": "p/m", "sections": [
+        {"section_name": "EASY", "questions": [{"id": "a", "question": "A?", "reply": "1", "correct": True, "comment": "off"}]},
+        {"section_name": "HARD", "questions": [{"id": "b", "question": "B?", "reply": "2", "correct": False}]},
+    ]}
+    assert [q["correct"] for _section, q in iter_questions(path)] == [True, False]
+
+def test_jsonl_round_trips_the_legacy_format(tmp_path):
+    legacy, jsonl = str(tmp_path / "m.json"), str(tmp_path / "m.jsonl")
+    save_results(legacy, DOCUMENT)
+    convert(legacy, jsonl)
+    questions = load_results(jsonl)["sections"][0]["questions"]
+    assert [q["reply"] for q in questions] == ["R"] and "id" in questions[0]
@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+import pytest
+
+from scheduler import PrioritySemaphore, RunLimits, RunStopped
+
+def test_waiters_are_woken_highest_priority_first():
+    async def main():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire()
+        order = []
+        async def worker(name, priority):
+            async with semaphore.slot(priority):
+                order.append(name)
+        tasks = [asyncio.create_task(worker(name, priority)) for name, priority in (("a", 1), ("b", 5), ("c", 5), ("d", 3))]
+        await asyncio.sleep(0)
+        semaphore.release()
+        await asyncio.gather(*tasks)
+        return order, semaphore.value
+    assert asyncio.run(main()) == (["b", "c", "d", "a"], 1)
+
+def test_cancelled_waiter_already_popped_by_release():
+    async def main():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire()
+        waiter = asyncio.create_task(semaphore.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()      # Cancels the waiter's future; its except branch runs on the next loop turn
+        semaphore.release()  # ...after release() has already popped the dead entry
+        results = await asyncio.gather(waiter, return_exceptions=True)
+        return results, semaphore.value, semaphore.waiters
+    results, value, waiters = asyncio.run(main())
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert (value, waiters) == (1, [])
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire()
+        waiter = asyncio.create_task(semaphore.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        waiters = list(semaphore.waiters)
+        semaphore.release()
+        return waiters, semaphore.value
+    assert asyncio.run(main()) == ([], 1)
+
+def test_budget_stops_the_run_for_good():
+    limits = RunLimits(budget=1.0)
+    limits.reserve(1.0, 0.6)
+    with pytest.raises(RunStopped) as stop:
+        limits.reserve(1.0, 0.6)  # 0.6 reserved + 0.6 would overrun
+    assert stop.value.reason == "budget" and limits.stopped == "budget"
+    limits.settle(0.6, 0.1)
+    assert (limits.spent, limits.reserved) == (0.1, 0.0)
+    with pytest.raises(RunStopped):
+        limits.reserve(1.0, 0.01)  # Stays stopped even though the budget now has room
+
+def test_settle_without_actual_cost_charges_the_expected_one():
+    limits = RunLimits(budget=10.0)
+    limits.reserve(1.0, 2.5)
+    limits.settle(2.5)
+    assert (limits.spent, limits.reserved, limits.stopped) == (2.5, 0.0, None)
+
+def test_deadline_skips_only_requests_that_cannot_finish():
+    limits = RunLimits(deadline=60)
+    with pytest.raises(RunStopped) as stop:
+        limits.reserve(120.0, 0.0)
+    assert stop.value.reason == "deadline"
+    limits.reserve(1.0, 0.0)  # A short request still runs
+    assert limits.stopped == "deadline"
+
+def test_no_limits_never_stop():
+    limits = RunLimits()
+    limits.reserve(time.monotonic(), 1e9)
+    assert limits.stopped is None
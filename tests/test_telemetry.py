@@ -0,0 +1,17 @@
+from telemetry import distribution, percentile
+
+def test_percentile_is_nearest_rank():
+    assert percentile([], 0.5) is None
+    assert percentile([7], 0.99) == 7
+    assert percentile([2, 1], 0.5) == 1
+    assert percentile([6, 5, 4, 3, 2, 1], 0.5) == 3
+    assert percentile(list(range(1, 11)), 0.5) == 5
+    assert percentile(list(range(1, 21)), 0.95) == 19
+    assert percentile(list(range(1, 101)), 0.95) == 95
+    assert percentile(list(range(1, 101)), 0.99) == 99
+    assert percentile(list(range(1, 11)), 1.0) == 10
+
+def test_distribution_skips_missing_values():
+    stats = distribution([None, 3, 1, 2, None])
+    assert (stats["p50"], stats["p95"], stats["p99"]) == (2, 3, 3)
+    assert distribution([None]) is None